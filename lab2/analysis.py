@@ -0,0 +1,173 @@
+import argparse as argp
+from typing import Any
+
+import numpy as np
+
+from lab2.vigenere import DEFAULT_ALPHABET, Vigenere, cached_table
+
+""" Relative frequencies of chars in english prose, used as the reference distribution for key recovery.
+"""
+ENGLISH_FREQUENCIES = {' ': 18.3, 'E': 10.2, 'T': 7.5, 'A': 6.5, 'O': 6.2, 'N': 5.7, 'I': 5.7, 'S': 5.3, 'R': 5.0,
+                       'H': 5.0, 'L': 3.3, 'D': 3.3, 'U': 2.3, 'C': 2.2, 'M': 2.0, 'F': 2.0, 'W': 1.7, 'G': 1.6,
+                       'P': 1.5, 'Y': 1.4, 'B': 1.3, ',': 1.0, '.': 0.9, 'V': 0.8, 'K': 0.6, '-': 0.2, 'X': 0.2,
+                       'J': 0.1, 'Q': 0.1, 'Z': 0.1, ':': 0.1}
+
+
+class VigenereAnalysis:
+    def __init__(self, ciphertext: str, alphabet: str = DEFAULT_ALPHABET):
+        """
+        Prepare a ciphertext for the statistical analysis, mapping it onto the alphabet indices once.
+
+        :param ciphertext: text encrypted with the Vigenere cipher
+        :param alphabet: alphabet used by the cipher
+        """
+        self.alphabet = alphabet
+        self.table = cached_table(alphabet)
+        self.indices: np.ndarray = self.table.to_indices(ciphertext).astype(np.intp)
+
+    def column_histograms(self, key_length: int, sample_size: int = None) -> np.ndarray:
+        """
+        Count every alphabet index in each of the columns made of chars sharing the key position.
+
+        :param sample_size: count only the first chars of the ciphertext, the default is all of them
+        :return: matrix of shape (key_length, alphabet length)
+        """
+        size = len(self.table)
+        indices = self.indices[:sample_size]
+        rows = len(indices) // key_length
+
+        # rows of the reshaped text are key periods, so the column offsets broadcast without a modulo
+        offsets = np.arange(key_length, dtype=np.intp) * size
+        codes = (indices[:rows * key_length].reshape(rows, key_length) + offsets).ravel()
+        tail = indices[rows * key_length:] + offsets[:len(indices) - rows * key_length]
+
+        return (np.bincount(codes, minlength=key_length * size) +
+                np.bincount(tail, minlength=key_length * size)).reshape(key_length, size)
+
+    def index_of_coincidence(self, max_length: int, sample_size: int = None) -> np.ndarray:
+        """
+        Mean index of coincidence of the columns for every candidate key length.
+
+        :param max_length: longest key length to check
+        :param sample_size: use only the first chars of the ciphertext, the default is all of them
+        :return: array where the value under position i belongs to the key length i + 1
+        """
+        result = np.zeros(max_length)
+
+        for length in range(1, max_length + 1):
+            histograms = self.column_histograms(length, sample_size)
+            sizes = histograms.sum(axis=1)
+            valid = sizes > 1
+
+            pairs = (histograms * (histograms - 1)).sum(axis=1)
+            result[length - 1] = np.mean(pairs[valid] / (sizes[valid] * (sizes[valid] - 1))) if valid.any() else 0
+
+        return result
+
+    def kasiski(self, max_length: int, ngram: int = 3) -> np.ndarray:
+        """
+        Kasiski examination: share of distances between repeated n-grams divisible by every candidate key length.
+        The length 1 divides every distance, so only the longer ones are informative.
+
+        :param max_length: longest key length to check
+        :param ngram: length of the repeated sequences
+        :return: array where the value under position i belongs to the key length i + 1
+        """
+        if len(self.indices) < ngram:
+            return np.zeros(max_length)
+
+        codes = np.zeros(len(self.indices) - ngram + 1, dtype=np.int64)
+
+        for i in range(ngram):
+            codes = codes * len(self.table) + self.indices[i:len(codes) + i].astype(np.int64)
+
+        order = np.argsort(codes, kind='stable')
+        repeated = codes[order[1:]] == codes[order[:-1]]
+        distances = (order[1:] - order[:-1])[repeated]
+
+        if not len(distances):
+            return np.zeros(max_length)
+
+        counts = np.bincount(distances)
+
+        return np.array([counts[length::length].sum() for length in range(1, max_length + 1)]) / len(distances)
+
+    def key_length(self, max_length: int = 32, tolerance: float = 0.9, sample_size: int = None) -> int:
+        """
+        Guess the key length as the shortest one with an index of coincidence close to the best one,
+        since every multiple of the real key length scores just as well.
+
+        :param max_length: longest key length to check
+        :param tolerance: part of the best index of coincidence accepted as close
+        :param sample_size: use only the first chars of the ciphertext, the default is all of them
+        """
+        ic = self.index_of_coincidence(max_length, sample_size)
+
+        return int(np.flatnonzero(ic >= tolerance * ic.max())[0]) + 1
+
+    def reference_distribution(self, frequencies: dict[str, float] = None) -> np.ndarray:
+        """
+        Map the char frequencies onto the alphabet indices, chars outside of the alphabet are skipped.
+        """
+        frequencies = frequencies or ENGLISH_FREQUENCIES
+        reference = np.zeros(len(self.table))
+
+        for (char, frequency) in frequencies.items():
+            if len(char) == 1 and char in self.alphabet:
+                reference[self.table.to_indices(char)[0]] = frequency
+
+        return reference / reference.sum()
+
+    def recover_key(self, key_length: int, frequencies: dict[str, float] = None) -> str:
+        """
+        Recover every key char by correlating its column histogram shifted by each alphabet index
+        with the reference distribution.
+
+        :param key_length: length of the key
+        :param frequencies: reference char frequencies of the plain text, the default is english prose
+        """
+        size = len(self.table)
+        reference = self.reference_distribution(frequencies)
+
+        # shifts[k, j] is the cipher index of the plain index j encrypted with the key index k
+        shifts = (np.arange(size)[:, None] + np.arange(size)[None, :]) % size
+        scores = self.column_histograms(key_length)[:, shifts] @ reference
+
+        return self.table.to_text(scores.argmax(axis=1))
+
+    def crack(self, max_length: int = 32, frequencies: dict[str, float] = None) -> (str, str):
+        """
+        Recover the most likely key and decrypt the ciphertext with it.
+
+        :return: key and the decrypted text
+        """
+        key = self.recover_key(self.key_length(max_length), frequencies)
+
+        return key, self.table.shift(self.table.to_text(self.indices), key, -1)
+
+
+def get_command_line_args() -> dict[str, Any]:
+    parser = argp.ArgumentParser(description="Recover the key of a Vigenere ciphertext.")
+
+    parser.add_argument('-f', type=str, metavar='FILEPATH', help='ciphertext file', required=True)
+    parser.add_argument('--max-length', type=int, metavar='N', default=32, help='longest key length to check')
+    parser.add_argument('--alphabet', type=str, metavar='STRING', default=DEFAULT_ALPHABET,
+                        help='alphabet used by the cipher')
+
+    return vars(parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = get_command_line_args()
+
+    with open(args['f'], 'r') as f:
+        analysis = VigenereAnalysis(Vigenere.prepare_string(f.read()), args['alphabet'])
+
+    ic = analysis.index_of_coincidence(args['max_length'])
+    kasiski = analysis.kasiski(args['max_length'])
+
+    for length in range(1, args['max_length'] + 1):
+        print(f'length {length:>3}: ic = {ic[length - 1]:.4f}, kasiski = {kasiski[length - 1]:.3f}')
+
+    key, _ = analysis.crack(args['max_length'])
+    print(f'\nKey: {key}')
@@ -1,18 +1,104 @@
 import argparse as argp
 import re
 import string
-from typing import Any
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import accumulate, islice, repeat
+from typing import Any, Iterator, TextIO
+
+import numpy as np
+
+DEFAULT_ALPHABET = string.ascii_uppercase + '_ .,-:'
+STREAM_BLOCK_SIZE = 1 << 20
+
+
+class AlphabetTable:
+    def __init__(self, alphabet: str):
+        """
+        Precompute the lookup tables of an alphabet used by the vectorized cipher engine.
+        Alphabets made of latin-1 chars are mapped byte-wise, the others via utf-32 code points.
+
+        :param alphabet: alphabet to index, every char position is its index
+        """
+        self.alphabet: str = alphabet
+        self.encoding: str = 'latin-1' if all(ord(c) < 256 for c in alphabet) else 'utf-32-le'
+        self.codes: np.ndarray = np.array([ord(c) for c in alphabet],
+                                          dtype=np.uint8 if self.encoding == 'latin-1' else np.uint32)
+
+        # the last entry is a sentinel for chars outside of the table range
+        self.index_type: type = np.int16 if len(alphabet) < 2 ** 14 else np.int64
+        self.lookup: np.ndarray = np.full(int(self.codes.max(initial=0)) + 2, -1, dtype=self.index_type)
+        self.lookup[self.codes] = np.arange(len(self.codes), dtype=self.index_type)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def to_indices(self, text: str) -> np.ndarray:
+        """
+        Map a whole text onto the alphabet indices.
+
+        :raises ValueError: When any char in given text doesn't exist in the alphabet.
+        """
+        try:
+            codes = np.frombuffer(text.encode(self.encoding), dtype=self.codes.dtype)
+        except UnicodeEncodeError as e:
+            raise ValueError(f"a letter in the input text doesn't match the alphabet -> {text[e.start]}")
+
+        indices = np.take(self.lookup, codes, mode='clip')
+
+        if len(invalid := np.flatnonzero(indices < 0)):
+            raise ValueError(f"a letter in the input text doesn't match the alphabet -> {text[invalid[0]]}")
+
+        return indices
+
+    def to_text(self, indices: np.ndarray) -> str:
+        """
+        Map alphabet indices back onto a text.
+        """
+        return self.codes[indices].tobytes().decode(self.encoding)
+
+    def shift(self, text: str, key: str, sign: int, offset: int = 0) -> str:
+        """
+        Shift every char of the text by the char of the key on the same position.
+
+        :param sign: 1 for encryption, -1 for decryption
+        :param offset: position in the key aligned with the first char of the text
+        """
+        if not key:
+            raise ValueError("the key must not be empty")
+
+        text_indices = self.to_indices(text)
+        key_indices = np.roll(self.to_indices(key), -(offset % len(key)))
+        key_indices = np.tile(key_indices, -(-len(text_indices) // len(key)))[:len(text_indices)]
+
+        return self.to_text((text_indices + sign * key_indices) % len(self))
+
+
+@lru_cache(maxsize=8)
+def cached_table(alphabet: str) -> AlphabetTable:
+    """
+    Alphabet table reused by every segment a worker process receives.
+    """
+    return AlphabetTable(alphabet)
+
+
+def shift_segment(alphabet: str, segment: str, key: str, sign: int, offset: int) -> str:
+    """
+    Picklable entry point of the worker processes shifting a single segment.
+    """
+    return cached_table(alphabet).shift(segment, key, sign, offset)
 
 
 class Vigenere:
-    def __init__(self, alphabet=(string.ascii_uppercase + '_ .,-:')):
+    def __init__(self, alphabet=DEFAULT_ALPHABET):
         """
         Construct the Vigenere cipher solver object.
 
         :param alphabet: Custom alphabet to use, the default is [A-Z_ .,-:].
         """
-        self.__char_map: dict[str, int] = None
-        self.__matrix: list[list] = [[] for _ in range(3)]
+        self.__table: AlphabetTable = None
+        self.__last: tuple[str, str, str] = ('', '', '')
 
         self.alphabet: str = alphabet
 
@@ -26,64 +112,134 @@ class Vigenere:
             raise TypeError("the given alphabet must be str")
 
         self.__alphabet = value
-        self.__char_map = {c: i for (i, c) in enumerate((c for c in self.__alphabet))}
+        self.__table = AlphabetTable(value)
 
     def print_setup(self) -> None:
         """
         Print used alphabet, decrypted text, key setup and the cipher.
         """
+        text, key, cipher = self.__last
+
         print(f'Alphabet: {self.alphabet}')
-        print(f'Text:     {self.__matrix[0]}')
-        print(f'Key fill: {self.__matrix[1]}')
-        print(f'Cipher:   {self.__matrix[2]}\n')
+        print(f'Text:     {list(text)}')
+        print(f'Key fill: {[key[i % len(key)] for i in range(len(text))]}')
+        print(f'Cipher:   {list(cipher)}\n')
 
     def encrypt(self, text: str, key: str) -> str:
-        self.__verify_input(text)
-        self.__verify_input(key)
+        cipher = self.__table.shift(text, key, 1)
+        self.__last = (text, key, cipher)
 
-        text_fill = [c for c in text]
-        key_fill = [key[i % len(key)] for i in range(len(text))]
-        cipher_fill = [' ' for _ in range(len(text))]
+        return cipher
 
-        self.__matrix = [text_fill] + [key_fill] + [cipher_fill]
+    def decrypt(self, text: str, key: str) -> str:
+        plain = self.__table.shift(text, key, -1)
+        self.__last = (plain, key, text)
 
-        for i in range(len(text)):
-            char_index = (self.__char_map[self.__matrix[0][i]] + self.__char_map[self.__matrix[1][i]]) % len(
-                self.alphabet)
+        return plain
 
-            self.__matrix[2][i] = next((key for (key, value) in self.__char_map.items() if value == char_index))
+    def encrypt_parallel(self, text: str, key: str, workers: int = None,
+                         segment_size: int = STREAM_BLOCK_SIZE) -> str:
+        """
+        Encrypt the text in key period aligned segments spread over a process pool.
 
-        return ''.join(self.__matrix[2])
+        :param workers: amount of worker processes, the default is the cpu count
+        :param segment_size: approximate amount of chars shifted by a worker at once
+        """
+        cipher = self.__shift_parallel(text, key, 1, workers, segment_size)
+        self.__last = (text, key, cipher)
 
-    def decrypt(self, text: str, key: str) -> str:
-        self.__verify_input(text)
-        self.__verify_input(key)
+        return cipher
 
-        text_fill = [' ' for _ in range(len(text))]
-        key_fill = [key[i % len(key)] for i in range(len(text))]
-        cipher_fill = [c for c in text]
+    def decrypt_parallel(self, text: str, key: str, workers: int = None,
+                         segment_size: int = STREAM_BLOCK_SIZE) -> str:
+        """
+        Decrypt the text in key period aligned segments spread over a process pool.
 
-        self.__matrix = [text_fill] + [key_fill] + [cipher_fill]
+        :param workers: amount of worker processes, the default is the cpu count
+        :param segment_size: approximate amount of chars shifted by a worker at once
+        """
+        plain = self.__shift_parallel(text, key, -1, workers, segment_size)
+        self.__last = (plain, key, text)
 
-        for i in range(len(self.__matrix[0])):
-            char_index = self.__char_map[self.__matrix[2][i]] - self.__char_map[self.__matrix[1][i]]
+        return plain
 
-            if char_index < 0:
-                char_index += len(self.alphabet)
+    def __shift_parallel(self, text: str, key: str, sign: int, workers: int, segment_size: int) -> str:
+        """
+        Shift segments which lengths are multiples of the key length, so each of them starts at key offset 0.
+        """
+        if not key:
+            raise ValueError("the key must not be empty")
 
-            self.__matrix[0][i] = next((key for (key, value) in self.__char_map.items() if value == char_index))
+        step = max(segment_size // len(key), 1) * len(key)
+        segments = (text[i:i + step] for i in range(0, len(text), step))
 
-        return ''.join(self.__matrix[0])
+        with ProcessPoolExecutor(workers) as pool:
+            return ''.join(pool.map(shift_segment, repeat(self.alphabet), segments, repeat(key), repeat(sign),
+                                    repeat(0)))
 
-    def __verify_input(self, text: str) -> None:
+    def encrypt_stream(self, source: TextIO, target: TextIO, key: str, block_size: int = STREAM_BLOCK_SIZE,
+                       prepare: bool = False, workers: int = 1) -> int:
         """
-        Check whether the text contains valid chars.
+        Encrypt a text stream block by block, writing each block as soon as it is done.
+
+        :param source: readable text stream
+        :param target: writable text stream
+        :param key: encryption key
+        :param block_size: amount of chars read at once
+        :param prepare: clean every block with `prepare_string` before encryption
+        :param workers: amount of worker processes shifting consecutive blocks
+        :return: amount of encrypted chars
+        """
+        return self.__shift_stream(source, target, key, 1, block_size, prepare, workers)
 
-        :raises ValueError: When any char in given text doesn't exist in the object's alphabet.
+    def decrypt_stream(self, source: TextIO, target: TextIO, key: str, block_size: int = STREAM_BLOCK_SIZE,
+                       prepare: bool = False, workers: int = 1) -> int:
+        """
+        Decrypt a text stream block by block, writing each block as soon as it is done.
+
+        :param source: readable text stream
+        :param target: writable text stream
+        :param key: decryption key
+        :param block_size: amount of chars read at once
+        :param prepare: clean every block with `prepare_string` before decryption
+        :param workers: amount of worker processes shifting consecutive blocks
+        :return: amount of decrypted chars
+        """
+        return self.__shift_stream(source, target, key, -1, block_size, prepare, workers)
+
+    def __shift_stream(self, source: TextIO, target: TextIO, key: str, sign: int, block_size: int,
+                       prepare: bool, workers: int) -> int:
+        """
+        Shift consecutive blocks of the source, carrying the key offset across block boundaries.
+        With more than one worker, batches of blocks are shifted by a process pool and written in order.
         """
-        for letter in text:
-            if (l := letter) not in self.alphabet:
-                raise ValueError(f"a letter in the input text doesn't match the alphabet -> {l}")
+        processed = 0
+        blocks = Vigenere.__read_blocks(source, block_size, prepare)
+        pool = ProcessPoolExecutor(workers) if workers > 1 else None
+
+        try:
+            while batch := list(islice(blocks, max(workers, 1))):
+                offsets = list(accumulate((len(b) for b in batch), initial=processed))
+
+                if pool:
+                    shifted = pool.map(shift_segment, repeat(self.alphabet), batch, repeat(key), repeat(sign), offsets)
+                else:
+                    shifted = map(self.__table.shift, batch, repeat(key), repeat(sign), offsets)
+
+                for block in shifted:
+                    target.write(block)
+
+                processed = offsets[-1]
+        finally:
+            if pool:
+                pool.shutdown()
+
+        return processed
+
+    @staticmethod
+    def __read_blocks(source: TextIO, block_size: int, prepare: bool) -> Iterator[str]:
+        while block := source.read(block_size):
+            yield Vigenere.prepare_string(block) if prepare else block
 
     @staticmethod
     def prepare_string(text: str) -> str:
@@ -113,6 +269,10 @@ class ConsoleApplication:
         parser.add_argument('--alphabet', type=str, metavar='STRING',
                             help='use a custom alphabet indexed in given order '
                                  '(ex. "ABCD_")')
+        parser.add_argument('--stream', action='store_true',
+                            help='process the -f file in constant memory blocks (disables verbose output)')
+        parser.add_argument('--workers', type=int, metavar='N', default=1,
+                            help='amount of processes used to shift the text in parallel')
 
         return vars(parser.parse_args())
 
@@ -127,6 +287,10 @@ class ConsoleApplication:
         if alphabet := args['alphabet']:
             app.alphabet = alphabet
 
+        if args['stream']:
+            ConsoleApplication.__run_stream(app, args)
+            return
+
         if text := args['t']:
             pass
         elif filepath := args['f']:
@@ -138,7 +302,9 @@ class ConsoleApplication:
 
         assert app and text and key, "one of the main objects haven't been initialized"
 
-        if args['dec']:
+        if (workers := args['workers']) > 1:
+            text = app.decrypt_parallel(text, key, workers) if args['dec'] else app.encrypt_parallel(text, key, workers)
+        elif args['dec']:
             text = app.decrypt(text, key)
         else:
             text = app.encrypt(text, key)
@@ -152,6 +318,24 @@ class ConsoleApplication:
         else:
             print(text)
 
+    @staticmethod
+    def __run_stream(app: Vigenere, args: dict[str, Any]) -> None:
+        """
+        Run the solver over the input file in blocks, writing the output as it is produced.
+        """
+        assert args['f'], "streaming requires an input file"
+
+        key = Vigenere.prepare_string(args['k'])
+        shift_stream = app.decrypt_stream if args['dec'] else app.encrypt_stream
+
+        with open(args['f'], 'r') as source:
+            if filepath := args['o']:
+                with open(filepath, 'w') as target:
+                    shift_stream(source, target, key, prepare=True, workers=args['workers'])
+            else:
+                shift_stream(source, sys.stdout, key, prepare=True, workers=args['workers'])
+                print()
+
 
 if __name__ == '__main__':
     ConsoleApplication.run()
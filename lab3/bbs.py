@@ -1,5 +1,35 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from math import lcm
+from os import cpu_count
+from random import Random
+from typing import Iterator, Union
+
+import numpy as np
 from Cryptodome.Random.random import getrandbits, randint
 
+OUTPUTS = ('bools', 'bytes', 'numpy')
+
+
+def small_primes(limit: int) -> list[int]:
+    """
+    Primes below the limit found with the sieve of Eratosthenes.
+    """
+    sieve = np.ones(limit, dtype=bool)
+    sieve[:2] = False
+
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = False
+
+    return np.flatnonzero(sieve).tolist()
+
+
+SMALL_PRIMES = small_primes(2048)
+SIEVE_WINDOW = 4096
+FLUSH_BITS = 4096
+
 
 class BBS:
     @staticmethod
@@ -37,19 +67,58 @@ class BBS:
         return True
 
     @staticmethod
-    def random_prime(bit_size: int, rounds: int = 40) -> int:
+    def sieved_prime(bit_size: int, rounds: int = 40, residue: int = 1, modulus: int = 2) -> int:
         """
-        Generate a random prime number within given bit range.
+        Generate a random prime number with the top bit set, congruent to the residue modulo the modulus.
+        Candidates are walked incrementally from a random start, the ones divisible by a small prime are crossed
+        out in windows and only the survivors go through the Miller-Rabin test.
 
-        :param bit_size: maximum bit size of the prime number
+        :param bit_size: exact bit size of the prime number
         :param rounds: iterations of the prime probability test (Miller-Robin)
+        :param residue: odd residue class of the prime number
+        :param modulus: even modulus of the residue class, candidates are this far apart
         :return: first probable prime number
         """
+        if bit_size < 2:
+            raise ValueError("bit size of a prime must be at least 2")
+
+        if modulus % 2 or residue % 2 == 0 or BBS.greatest_common_divisor(residue, modulus) != 1:
+            raise ValueError("the modulus must be even and the residue odd and coprime with it")
+
+        low, high = 1 << (bit_size - 1), 1 << bit_size
+
+        # primes dividing the modulus never divide a candidate, the ones above the low bound could be the candidate
+        sieve_primes = [p for p in SMALL_PRIMES if p < low and modulus % p]
+        inverses = [pow(modulus, -1, p) for p in sieve_primes]
+
         while True:
-            num = getrandbits(bit_size)
+            start = low | getrandbits(bit_size - 1)
+            start += (residue - start) % modulus
+
+            while start < high:
+                count = min(SIEVE_WINDOW, (high - 1 - start) // modulus + 1)
+                composite = np.zeros(count, dtype=bool)
+
+                # candidate start + j * modulus is divisible by p for j = -start / modulus (mod p)
+                for (p, inverse) in zip(sieve_primes, inverses):
+                    composite[-start * inverse % p::p] = True
+
+                for j in np.flatnonzero(~composite).tolist():
+                    if BBS.is_probably_prime(num := start + j * modulus, rounds):
+                        return num
+
+                start += count * modulus
+
+    @staticmethod
+    def random_prime(bit_size: int, rounds: int = 40) -> int:
+        """
+        Generate a random prime number of given bit size.
 
-            if BBS.is_probably_prime(num, rounds):
-                return num
+        :param bit_size: bit size of the prime number
+        :param rounds: iterations of the prime probability test (Miller-Robin)
+        :return: first probable prime number
+        """
+        return BBS.sieved_prime(bit_size, rounds)
 
     @staticmethod
     def is_congrugent(a: int, b: int, n: int) -> bool:
@@ -58,13 +127,9 @@ class BBS:
     @staticmethod
     def valid_prime(bit_size: int) -> int:
         """
-        Generate a prime number that is BBS algorithm valid.
+        Generate a prime number that is BBS algorithm valid, congruent to 3 modulo 4.
         """
-        while True:
-            num = BBS.random_prime(bit_size)
-
-            if BBS.is_congrugent(num, 3, 4):
-                return num
+        return BBS.sieved_prime(bit_size, residue=3, modulus=4)
 
     @staticmethod
     def greatest_common_divisor(a: int, b: int) -> int:
@@ -74,38 +139,321 @@ class BBS:
         return a if b == 0 else BBS.greatest_common_divisor(b, a % b)
 
     @staticmethod
-    def generate(length: int, bit_size: int = 512, preseed: int = None) -> list[bool]:
+    def blum_number(bit_size: int = 512, pool=None) -> int:
+        """
+        Generate a Blum number from two BBS algorithm valid primes.
+
+        :param pool: `lab3.prime_pool.PrimePool` to take the primes from instead of searching for them
+        """
+        if pool is not None:
+            prime1, prime2 = pool.take(bit_size, 2, residue=3, modulus=4)
+        else:
+            prime1 = BBS.valid_prime(bit_size)
+            prime2 = BBS.valid_prime(bit_size)
+
+        return prime1 * prime2
+
+    @staticmethod
+    def random_seed(blum_number: int) -> int:
+        """
+        Draw a seed coprime with the Blum number.
+        """
+        x = 0
+
+        while BBS.greatest_common_divisor(x, blum_number) != 1 and x != blum_number:
+            x = randint(1, blum_number)
+
+        return x
+
+    @staticmethod
+    def max_bits_per_step(blum_number: int) -> int:
+        """
+        Amount of the lowest bits of every square that can be safely extracted, floor(log2(log2 n)).
+        log2 n lies in [b - 1, b) for a b bit n and no power of two lies strictly between b - 1 and b,
+        so it's floor(log2(b - 1)), ex. 9 for every 1024 bit n and 10 from 1025 bits.
+        """
+        return max((blum_number.bit_length() - 1).bit_length() - 1, 1)
+
+    @staticmethod
+    def packed_squares(elem: int, blum_number: int, length: int, bits_per_step: int = 1) -> (bytearray, int):
+        """
+        Extract the lowest bits of consecutive squares straight into packed bytes, most significant bit of every
+        value first. The bits gather in a small integer that is flushed as whole bytes, so nothing holds
+        a value per square.
+
+        :param elem: first square to extract the bits from
+        :param blum_number: modulus of the squaring
+        :param length: length of the series, extra bits of the last value are dropped
+        :param bits_per_step: amount of the lowest bits taken from every square
+        :return: the series zero filled up to a full byte and the square following the last one used
+        """
+        mask = (1 << bits_per_step) - 1
+        packed = bytearray()
+        acc, bits = 0, 0
+
+        for _ in range(-(-length // bits_per_step)):
+            if bits >= FLUSH_BITS:
+                whole = bits // 8 * 8
+                packed += (acc >> (bits - whole)).to_bytes(whole // 8, 'big')
+                acc &= (1 << (bits - whole)) - 1
+                bits -= whole
+
+            acc = acc << bits_per_step | elem & mask
+            bits += bits_per_step
+            elem = pow(elem, 2, blum_number)
+
+        # the extra bits all come from the last value, which is never flushed before this point
+        extra = -length % bits_per_step
+        acc, bits = acc >> extra, bits - extra
+        packed += (acc << (-bits % 8)).to_bytes(-(-bits // 8), 'big')
+
+        return packed, elem
+
+    @staticmethod
+    def unpack(packed: bytearray, length: int, output: str = 'bytes') -> Union[list[bool], bytes, np.ndarray]:
+        """
+        Convert a series from `packed_squares` to the output, the packed outputs share its zero filled last byte.
+
+        :param output: 'bools' for a list of bools, 'bytes' for packed bytes, 'numpy' for a packed uint8 array
+        """
+        if output not in OUTPUTS:
+            raise ValueError(f"output must be one of {OUTPUTS}")
+
+        if output == 'bools':
+            return np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=length).astype(bool).tolist()
+
+        return bytes(packed) if output == 'bytes' else np.frombuffer(packed, dtype=np.uint8)
+
+    @staticmethod
+    def generate(length: int, bit_size: int = 512, preseed: int = None, bits_per_step: int = 1,
+                 output: str = 'bools', pool=None) -> Union[list[bool], bytes, np.ndarray]:
         """
         Generate random bit series using the BBS algorithm.
 
         :param length: length of the output series
         :param bit_size: maximum bit size of the prime numbers used to generate the Blum number
         :param preseed: preinitialize Blum number's value
+        :param bits_per_step: amount of the lowest bits taken from every square, at most `max_bits_per_step`
+        :param output: 'bools' for a list of bools, 'bytes' for packed bytes, 'numpy' for a packed uint8 array
+        :param pool: `lab3.prime_pool.PrimePool` to take the Blum number's primes from
         :return: generated series
         """
+        if output not in OUTPUTS:
+            raise ValueError(f"output must be one of {OUTPUTS}")
 
-        blum_number = 0
+        blum_number = preseed if preseed is not None else BBS.blum_number(bit_size, pool)
 
-        if preseed is not None:
-            blum_number = preseed
+        if not 0 < bits_per_step <= BBS.max_bits_per_step(blum_number):
+            raise ValueError(f"bits_per_step must be between 1 and {BBS.max_bits_per_step(blum_number)}")
 
-        else:
-            prime1 = BBS.valid_prime(bit_size)
-            prime2 = BBS.valid_prime(bit_size)
+        elem = pow(BBS.random_seed(blum_number), 2, blum_number)
+        packed, _ = BBS.packed_squares(elem, blum_number, length, bits_per_step)
 
-            blum_number = prime1 * prime2
+        return BBS.unpack(packed, length, output)
 
-        x = 0
+    @staticmethod
+    def jump(elem: int, index: int, prime1: int, prime2: int) -> int:
+        """
+        Jump ahead to the square at given index without the squarings in between,
+        x_i = x_0^(2^i mod lcm(p - 1, q - 1)) mod n.
 
-        while BBS.greatest_common_divisor(x, blum_number) != 1 and x != blum_number:
-            x = randint(1, blum_number)
+        :param elem: square under the index 0
+        :param index: index of the square to compute
+        :param prime1: first factor of the Blum number
+        :param prime2: second factor of the Blum number
+        """
+        return pow(elem, pow(2, index, lcm(prime1 - 1, prime2 - 1)), prime1 * prime2)
 
-        result = []
-        elem = pow(x, 2, blum_number)
+    @staticmethod
+    def trim(packed: bytes, length: int, output: str = 'bytes') -> Union[list[bool], bytes, np.ndarray]:
+        """
+        Cut packed bits to the length of the series, zero filling the last byte like `pack` does.
+        """
+        if output not in OUTPUTS:
+            raise ValueError(f"output must be one of {OUTPUTS}")
 
-        for _ in range(length):
-            result += [bin(elem)[-1] == '1']
+        result = np.frombuffer(packed, dtype=np.uint8)[:-(-length // 8)].copy()
 
-            elem = pow(elem, 2, blum_number)
+        if length % 8:
+            result[-1] &= (0xFF << (8 - length % 8)) & 0xFF
+
+        if output == 'bools':
+            return np.unpackbits(result, count=length).astype(bool).tolist()
+
+        return result.tobytes() if output == 'bytes' else result
+
+    @staticmethod
+    def generate_at(start: int, length: int, prime1: int, prime2: int, seed: int, bits_per_step: int = 1,
+                    output: str = 'bytes') -> Union[list[bool], bytes, np.ndarray]:
+        """
+        Generate the part of the BBS series that starts at given square index.
+        With more than one bit per step the series starts at the bit `start * bits_per_step`.
+
+        :param start: index of the first square used
+        :param length: length of the output series
+        :param prime1: first factor of the Blum number
+        :param prime2: second factor of the Blum number
+        :param seed: seed of the whole series, coprime with the Blum number
+        :param bits_per_step: amount of the lowest bits taken from every square
+        :param output: 'bools' for a list of bools, 'bytes' for packed bytes, 'numpy' for a packed uint8 array
+        :return: generated series
+        """
+        blum_number = prime1 * prime2
+        elem = BBS.jump(pow(seed, 2, blum_number), start, prime1, prime2)
+        packed, _ = BBS.packed_squares(elem, blum_number, length, bits_per_step)
+
+        return BBS.unpack(packed, length, output)
+
+    @staticmethod
+    def generate_parallel(length: int, prime1: int, prime2: int, seed: int, bits_per_step: int = 1,
+                          output: str = 'bytes', workers: int = None) -> Union[list[bool], bytes, np.ndarray]:
+        """
+        Generate the BBS series in index ranges computed by a process pool, joined into the same series
+        `generate_at(0, ...)` returns.
+
+        :param length: length of the output series
+        :param prime1: first factor of the Blum number
+        :param prime2: second factor of the Blum number
+        :param seed: seed of the whole series, coprime with the Blum number
+        :param bits_per_step: amount of the lowest bits taken from every square
+        :param output: 'bools' for a list of bools, 'bytes' for packed bytes, 'numpy' for a packed uint8 array
+        :param workers: amount of worker processes, the default is the cpu count
+        :return: generated series
+        """
+        workers = workers or cpu_count() or 1
+        steps = -(-length // bits_per_step)
+
+        # ranges hold a multiple of 8 squares, so every range fills whole bytes and packed ranges can be joined
+        range_steps = max(-(-steps // (workers * 4 * 8)) * 8, 8)
+        starts = range(0, steps, range_steps)
+
+        with ProcessPoolExecutor(workers) as pool:
+            packed = b''.join(pool.map(BBS.generate_at, starts, repeat(range_steps * bits_per_step), repeat(prime1),
+                                       repeat(prime2), repeat(seed), repeat(bits_per_step)))
+
+        return BBS.trim(packed, length, output)
+
+
+class BBSRandom(Random):
+    VERSION = 1
+
+    def __init__(self, blum_number: int = None, bit_size: int = 512, bits_per_step: int = None,
+                 buffer_size: int = 4096):
+        """
+        Stateful BBS random source usable in place of `random.Random`.
+
+        :param blum_number: modulus of the squaring, a new one is generated when not given
+        :param bit_size: maximum bit size of the prime numbers used to generate the Blum number
+        :param bits_per_step: amount of the lowest bits taken from every square, the default is `max_bits_per_step`
+        :param buffer_size: amount of bytes generated at once
+        """
+        self.blum_number: int = blum_number if blum_number is not None else BBS.blum_number(bit_size)
+        self.bits_per_step: int = bits_per_step or BBS.max_bits_per_step(self.blum_number)
+        self.buffer_size: int = buffer_size
+
+        if not 0 < self.bits_per_step <= BBS.max_bits_per_step(self.blum_number):
+            raise ValueError(f"bits_per_step must be between 1 and {BBS.max_bits_per_step(self.blum_number)}")
+
+        self.__elem: int = 0
+        self.__buffer: bytes = b''
+        self.__position: int = 0
+
+        super().__init__()
+
+    def seed(self, a: int = None, version: int = 2) -> None:
+        """
+        Set the current residue from the given seed, a random one is drawn when not given.
+
+        :raises ValueError: When the seed isn't coprime with the Blum number.
+        """
+        x = BBS.random_seed(self.blum_number) if a is None else a % self.blum_number
+
+        if BBS.greatest_common_divisor(x, self.blum_number) != 1:
+            raise ValueError("the seed must be coprime with the Blum number")
+
+        self.__elem = pow(x, 2, self.blum_number)
+        self.__buffer, self.__position = b'', 0
+        self.gauss_next = None
+
+    def __refill(self) -> None:
+        """
+        Generate the next buffer of bytes, continuing from the current residue.
+        """
+        length = self.buffer_size * 8
+        packed, self.__elem = BBS.packed_squares(self.__elem, self.blum_number, length, self.bits_per_step)
+
+        self.__buffer, self.__position = bytes(packed), 0
+
+    def randbytes(self, n: int) -> bytes:
+        out = bytearray()
+
+        while len(out) < n:
+            if self.__position == len(self.__buffer):
+                self.__refill()
+
+            take = min(n - len(out), len(self.__buffer) - self.__position)
+            out += self.__buffer[self.__position:self.__position + take]
+            self.__position += take
+
+        return bytes(out)
+
+    def getrandbits(self, k: int) -> int:
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+
+        size = (k + 7) // 8
+
+        return int.from_bytes(self.randbytes(size), 'big') >> (size * 8 - k)
+
+    def random(self) -> float:
+        return self.getrandbits(53) * 2 ** -53
+
+    def __iter__(self) -> Iterator[bool]:
+        """
+        Endless series of random bits, consumed byte by byte.
+        """
+        while True:
+            byte = self.randbytes(1)[0]
+
+            for shift in range(7, -1, -1):
+                yield byte >> shift & 1 == 1
+
+    def getstate(self) -> tuple:
+        return (BBSRandom.VERSION, self.blum_number, self.bits_per_step, self.__elem,
+                self.__buffer[self.__position:], self.gauss_next)
+
+    def setstate(self, state: tuple) -> None:
+        if state[0] != BBSRandom.VERSION:
+            raise ValueError(f"state with version {state[0]} passed to BBSRandom version {BBSRandom.VERSION}")
+
+        _, self.blum_number, self.bits_per_step, self.__elem, self.__buffer, self.gauss_next = state
+        self.__position = 0
+
+    def __reduce__(self) -> tuple:
+        return self.__class__, (self.blum_number, 0, self.bits_per_step, self.buffer_size), self.getstate()
+
+    def checkpoint(self, path: str) -> None:
+        """
+        Save the current state to a file, so a long-running job can resume the series.
+        """
+        version, blum_number, bits_per_step, elem, buffer, gauss_next = self.getstate()
+
+        with open(path, 'w') as f:
+            json.dump({'version': version, 'blum_number': hex(blum_number), 'bits_per_step': bits_per_step,
+                       'elem': hex(elem), 'buffer': buffer.hex(), 'gauss_next': gauss_next,
+                       'buffer_size': self.buffer_size}, f)
+
+    @staticmethod
+    def restore(path: str) -> 'BBSRandom':
+        """
+        Recreate a random source from a checkpoint file.
+        """
+        with open(path, 'r') as f:
+            state = json.load(f)
+
+        blum_number = int(state['blum_number'], 16)
+        result = BBSRandom(blum_number, bits_per_step=state['bits_per_step'], buffer_size=state['buffer_size'])
+        result.setstate((state['version'], blum_number, state['bits_per_step'], int(state['elem'], 16),
+                         bytes.fromhex(state['buffer']), state['gauss_next']))
 
         return result
@@ -0,0 +1,188 @@
+import argparse as argp
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Iterable, Iterator, Union
+
+import numpy as np
+
+from lab3.bbs import BBSRandom
+from lab3.fips_tests import BLOCK_BITS, BLOCK_BYTES, Fips140_2PackedTests
+
+TESTS = ('single_bits', 'series', 'long_series', 'poker', 'all')
+
+
+def file_chunks(source: Union[str, BinaryIO], chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """
+    Read a file (path, '-' for stdin or an open binary file) in chunks.
+    """
+    if isinstance(source, str):
+        if source == '-':
+            yield from file_chunks(sys.stdin.buffer, chunk_size)
+            return
+
+        with open(source, 'rb') as f:
+            yield from file_chunks(f, chunk_size)
+            return
+
+    while chunk := source.read(chunk_size):
+        yield chunk
+
+
+def bbs_chunks(length: int, chunk_size: int = 1 << 16, rng: BBSRandom = None) -> Iterator[bytes]:
+    """
+    Draw the given amount of bytes from a BBS random source in chunks.
+    """
+    rng = rng or BBSRandom()
+
+    for start in range(0, length, chunk_size):
+        yield rng.randbytes(min(chunk_size, length - start))
+
+
+def batches(chunks: Iterable[bytes], batch_blocks: int) -> Iterator[bytes]:
+    """
+    Cut a stream of chunks of any size into batches of whole 20000 bit blocks, the last one may be shorter
+    and may end with an incomplete block.
+    """
+    size = batch_blocks * BLOCK_BYTES
+    pending = bytearray()
+
+    for chunk in chunks:
+        pending += chunk
+
+        while len(pending) >= size:
+            yield bytes(pending[:size])
+            del pending[:size]
+
+    if pending:
+        yield bytes(pending)
+
+
+def assess_batch(data: bytes) -> dict[str, Any]:
+    """
+    Run the FIPS tests over a batch and reduce the result to counts and sums that can be merged.
+    """
+    blocks = Fips140_2PackedTests.blocks(data)
+    passed, statistics = Fips140_2PackedTests.evaluate(blocks)
+    ones, poker = statistics['single_bits'], statistics['poker']
+
+    return {'blocks': len(blocks),
+            'trailing_bits': (len(data) - len(blocks) * BLOCK_BYTES) * 8,
+            'passed': {test: int(flags.sum()) for (test, flags) in passed.items()},
+            'failures': {test: np.flatnonzero(~flags).tolist() for (test, flags) in passed.items()},
+            'ones': (int(ones.sum()), int((ones ** 2).sum())),
+            'poker': (float(poker.sum()), float((poker ** 2).sum())),
+            'runs': statistics['series'].sum(axis=0).tolist(),
+            'longest_run': int(statistics['long_series'].max(initial=0))}
+
+
+class FipsReport:
+    def __init__(self, max_failures: int = 1000):
+        """
+        Aggregate of the per-batch results, holding at most `max_failures` failing block offsets per test.
+        """
+        self.max_failures = max_failures
+
+        self.blocks = 0
+        self.trailing_bits = 0
+        self.passed = {test: 0 for test in TESTS}
+        self.failures = {test: [] for test in TESTS}
+        self.sums = {'ones': [0, 0], 'poker': [0.0, 0.0]}
+        self.runs = np.zeros((2, 6), dtype=np.int64)
+        self.longest_run = 0
+
+    def merge(self, batch: dict[str, Any]) -> None:
+        """
+        Merge the result of the next batch, failing block indices become byte offsets of the whole input.
+        """
+        for test in TESTS:
+            self.passed[test] += batch['passed'][test]
+
+            free = self.max_failures - len(self.failures[test])
+            self.failures[test] += [(self.blocks + i) * BLOCK_BYTES for i in batch['failures'][test][:free]]
+
+        for key in self.sums:
+            self.sums[key][0] += batch[key][0]
+            self.sums[key][1] += batch[key][1]
+
+        self.runs += np.array(batch['runs'])
+        self.longest_run = max(self.longest_run, batch['longest_run'])
+        self.blocks += batch['blocks']
+        self.trailing_bits = batch['trailing_bits']
+
+    def __statistics(self, key: str) -> dict[str, float]:
+        total, squares = self.sums[key]
+        mean = total / self.blocks if self.blocks else 0.0
+
+        return {'mean': mean, 'stdev': max(squares / self.blocks - mean ** 2, 0.0) ** 0.5 if self.blocks else 0.0}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'blocks': self.blocks,
+                'bits': self.blocks * BLOCK_BITS,
+                'trailing_bits': self.trailing_bits,
+                'pass_rates': {test: self.passed[test] / self.blocks if self.blocks else 0.0 for test in TESTS},
+                'failed_blocks': {test: self.blocks - self.passed[test] for test in TESTS},
+                'failing_offsets': self.failures,
+                'statistics': {'ones': self.__statistics('ones'),
+                               'poker': self.__statistics('poker'),
+                               'runs': {'zeros': self.runs[0].tolist(), 'ones': self.runs[1].tolist()},
+                               'longest_run': self.longest_run}}
+
+
+def run(chunks: Iterable[bytes], workers: int = None, batch_blocks: int = 256, max_failures: int = 1000) -> dict:
+    """
+    Assess a stream of bytes in consecutive 20000 bit blocks with a worker pool.
+    At most two batches per worker are in flight, so the memory use doesn't depend on the input size.
+
+    :param chunks: bytes of any chunk size (ex. `file_chunks`, `bbs_chunks` or any other generator)
+    :param workers: amount of worker processes, the default is the cpu count
+    :param batch_blocks: amount of blocks assessed by a worker at once
+    :param max_failures: amount of failing block offsets reported per test
+    :return: report of the whole stream
+    """
+    report = FipsReport(max_failures)
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        limit = 2 * workers
+
+        for batch in batches(chunks, batch_blocks):
+            pending.append(pool.submit(assess_batch, batch))
+
+            while len(pending) >= limit or pending and pending[0].done():
+                report.merge(pending.popleft().result())
+
+        while pending:
+            report.merge(pending.popleft().result())
+
+    return report.to_dict()
+
+
+def get_command_line_args() -> dict[str, Any]:
+    parser = argp.ArgumentParser(description="Run the FIPS 140-2 tests over consecutive 20000 bit blocks.")
+
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('-f', type=str, metavar='FILEPATH', help="binary file to assess, '-' for stdin")
+    input_group.add_argument('--bbs', type=int, metavar='BLOCKS', help='assess given amount of BBS blocks')
+
+    parser.add_argument('-o', type=str, metavar='FILEPATH', help='output the JSON report to file with given path')
+    parser.add_argument('--workers', type=int, metavar='N', help='amount of worker processes')
+    parser.add_argument('--batch', type=int, metavar='BLOCKS', default=256, help='blocks assessed at once')
+
+    return vars(parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = get_command_line_args()
+
+    source = file_chunks(args['f']) if args['f'] else bbs_chunks(args['bbs'] * BLOCK_BYTES)
+    result = json.dumps(run(source, args['workers'], args['batch']), indent=2)
+
+    if filepath := args['o']:
+        with open(filepath, 'w') as f:
+            f.write(result)
+    else:
+        print(result)
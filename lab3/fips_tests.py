@@ -1,5 +1,28 @@
+from typing import Union
+
+import numpy as np
+
 from lab3.bbs import BBS
 
+BLOCK_BITS = 20000
+BLOCK_BYTES = BLOCK_BITS // 8
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+LONG_RUN = 26
+WORDS = -(-BLOCK_BITS // 64)
+""" Mask of the bits of a block in its words, the zero fill of the last word isn't part of any run """
+VALID_WORDS = np.full(WORDS, np.iinfo(np.uint64).max, dtype=np.uint64)
+VALID_WORDS[-1] <<= np.uint64(WORDS * 64 - BLOCK_BITS)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """
+    Amount of set bits in every row of 64 bit words.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+
+    return POPCOUNT[words.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
 
 class Fips140_2TestsFor20kElemSeries:
     VALID_SERIES = {1: (2315, 2685),
@@ -112,6 +135,183 @@ class Fips140_2TestsFor20kElemSeries:
         print(f'Poker        = {c4} => {v4}')
 
 
+class Fips140_2PackedTests:
+    """
+    Vectorized FIPS 140-2 tests over packed 20000 bit blocks, every test checks all of the given blocks at once.
+    Blocks are rows of an uint8 array of shape (blocks, 2500), the most significant bit of a byte comes first.
+    """
+    VALID_SERIES = np.array([Fips140_2TestsFor20kElemSeries.VALID_SERIES[i] for i in range(1, 7)])
+
+    @staticmethod
+    def blocks(data: Union[bytes, bytearray, memoryview, np.ndarray]) -> np.ndarray:
+        """
+        View packed data as 20000 bit blocks, the trailing incomplete block is dropped.
+        """
+        packed = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.ravel()
+
+        return packed[:len(packed) // BLOCK_BYTES * BLOCK_BYTES].reshape(-1, BLOCK_BYTES)
+
+    @staticmethod
+    def pack(series: [bool]) -> np.ndarray:
+        """
+        Convert a series of bools into packed blocks.
+        """
+        return Fips140_2PackedTests.blocks(np.packbits(np.array(series, dtype=bool)))
+
+    @staticmethod
+    def single_bits(blocks: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Monobit test, counts the ones with a popcount table.
+
+        :return: pass flags and counts of ones of every block
+        """
+        ones = POPCOUNT[blocks].sum(axis=1, dtype=np.int64)
+
+        return (9725 < ones) & (ones < 10275), ones
+
+    @staticmethod
+    def words(blocks: np.ndarray) -> np.ndarray:
+        """
+        Blocks as rows of 64 bit words, bit i of a block is the bit 63 - i % 64 of the word i // 64,
+        the last word is zero filled.
+        """
+        padded = np.zeros((len(blocks), WORDS * 8), dtype=np.uint8)
+        padded[:, :BLOCK_BYTES] = blocks
+
+        return padded.view('>u8').astype(np.uint64)
+
+    @staticmethod
+    def run_counts(blocks: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Count the runs of every block with shifts and masks over its words, without a value per bit or per run.
+        A run of at least n bits starts at i when i starts a run and the bits i to i + n - 1 are all equal,
+        the chain of the latter is extended by one bit per step until no block has a run that long.
+        Blocks with a run of `LONG_RUN` bits leave the chain, their longest run is measured on the unpacked bits.
+
+        :return: counts of the runs of shape (blocks, 2, 6), indexed by the bit value and the run length - 1
+                 (the runs of 6 and more together), and the longest run of every block
+        """
+        one, last = np.uint64(1), np.uint64(63)
+        ones = Fips140_2PackedTests.words(blocks)
+        at_least = np.zeros((len(blocks), 2, 7), dtype=np.int64)
+        longest = np.zeros(len(blocks), dtype=np.int64)
+
+        for (value, bits) in ((0, ~ones & VALID_WORDS), (1, ones)):
+            previous = bits >> one
+            previous[:, 1:] |= bits[:, :-1] << last
+            starts = bits & ~previous
+            chain, rows, length = bits, np.arange(len(blocks)), 0
+
+            while length < LONG_RUN and (alive := chain.any(axis=1)).any():
+                # past the counted lengths only the blocks with a longer run are followed
+                if length >= 6:
+                    chain, rows = chain[alive], rows[alive]
+                    alive = np.ones(len(rows), dtype=bool)
+
+                length += 1
+                longest[rows[alive]] = np.maximum(longest[rows[alive]], length)
+
+                if length <= 6:
+                    at_least[:, value, length] = popcount(starts & chain)
+
+                following = chain << one
+                following[:, :-1] |= chain[:, 1:] >> last
+                chain = chain & following
+
+        for i in np.flatnonzero(longest >= LONG_RUN).tolist():
+            boundaries = np.flatnonzero(np.diff(np.unpackbits(blocks[i]), prepend=2, append=2))
+            longest[i] = np.diff(boundaries).max()
+
+        counts = at_least[:, :, 1:].copy()
+        counts[:, :, :5] -= at_least[:, :, 2:]
+
+        return counts, longest
+
+    @staticmethod
+    def series(blocks: np.ndarray, runs: tuple = None) -> (np.ndarray, np.ndarray):
+        """
+        Runs test, counts the runs of both zeros and ones by length, the ones of 6 and more together.
+
+        :param runs: result of `run_counts` for the blocks, counted when not given
+        :return: pass flags and counts of shape (blocks, 2, 6), indexed by the bit value and the run length - 1
+        """
+        counts, _ = runs or Fips140_2PackedTests.run_counts(blocks)
+
+        low, high = Fips140_2PackedTests.VALID_SERIES[:, 0], Fips140_2PackedTests.VALID_SERIES[:, 1]
+
+        return ((low <= counts) & (counts <= high)).all(axis=(1, 2)), counts
+
+    @staticmethod
+    def long_series(blocks: np.ndarray, runs: tuple = None) -> (np.ndarray, np.ndarray):
+        """
+        Long runs test, no run of 26 or more equal bits is allowed.
+
+        :param runs: result of `run_counts` for the blocks, counted when not given
+        :return: pass flags and the longest run of every block
+        """
+        _, longest = runs or Fips140_2PackedTests.run_counts(blocks)
+
+        return longest < LONG_RUN, longest
+
+    @staticmethod
+    def poker(blocks: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Poker test, counts the 4 bit values of every block.
+
+        :return: pass flags and the statistic of every block
+        """
+        # a byte holds two nibbles, so the nibble counts follow from the byte counts of every block
+        codes = blocks + np.arange(len(blocks), dtype=np.int32)[:, None] * 256
+        bytes_counts = np.bincount(codes.ravel(), minlength=len(blocks) * 256).reshape(-1, 16, 16)
+        counts = bytes_counts.sum(axis=2) + bytes_counts.sum(axis=1)
+
+        value = 16 / 5000 * (counts ** 2).sum(axis=1) - 5000
+
+        return (2.16 < value) & (value < 46.17), value
+
+    @staticmethod
+    def evaluate(blocks: np.ndarray) -> (dict[str, np.ndarray], dict[str, np.ndarray]):
+        """
+        Run all of the tests over the blocks.
+
+        :return: pass flags of every test and of all of them together, and the statistics of every test:
+                 the counts of ones, the run counts, the longest runs and the poker values
+        """
+        runs = Fips140_2PackedTests.run_counts(blocks)
+        results = {'single_bits': Fips140_2PackedTests.single_bits(blocks),
+                   'series': Fips140_2PackedTests.series(blocks, runs),
+                   'long_series': Fips140_2PackedTests.long_series(blocks, runs),
+                   'poker': Fips140_2PackedTests.poker(blocks)}
+
+        passed = {test: flags for (test, (flags, _)) in results.items()}
+        passed['all'] = np.logical_and.reduce(list(passed.values()))
+
+        return passed, {test: statistic for (test, (_, statistic)) in results.items()}
+
+    @staticmethod
+    def test(blocks: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Run all of the tests over the blocks.
+
+        :return: pass flags of every test and of all of them together
+        """
+        return Fips140_2PackedTests.evaluate(blocks)[0]
+
+    @staticmethod
+    def assess(data: Union[bytes, bytearray, memoryview, np.ndarray],
+               batch_blocks: int = 256) -> dict[str, np.ndarray]:
+        """
+        Run all of the tests over packed data in batches of blocks, bounding the unpacked working set.
+
+        :return: pass flags of every test and of all of them together, for every block
+        """
+        blocks = Fips140_2PackedTests.blocks(data)
+        results = [Fips140_2PackedTests.test(blocks[i:i + batch_blocks]) for i in range(0, len(blocks), batch_blocks)]
+
+        return {key: np.concatenate([r[key] for r in results]) if results else np.zeros(0, dtype=bool)
+                for key in ('single_bits', 'series', 'long_series', 'poker', 'all')}
+
+
 if __name__ == '__main__':
     series = BBS.generate(20000)
 
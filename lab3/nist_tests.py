@@ -0,0 +1,294 @@
+from math import erfc, exp, floor, lgamma, log, log2, sqrt
+from typing import Union
+
+import numpy as np
+
+from lab3.bbs import BBS
+
+SIGNIFICANCE = 0.01
+
+""" Parameters of the longest run of ones test by the minimal series length:
+    (block length, upper bounds of the classes, class probabilities).
+"""
+LONGEST_RUN_PARAMETERS = [(750000, 10000, [10, 11, 12, 13, 14, 15],
+                           [0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727]),
+                          (6272, 128, [4, 5, 6, 7, 8], [0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124]),
+                          (128, 8, [1, 2, 3], [0.2148, 0.3672, 0.2305, 0.1875])]
+
+
+def igamc(a: float, x: float) -> float:
+    """
+    Regularized upper incomplete gamma function Q(a, x), a series below x = a + 1 and a continued fraction above.
+    """
+    if x <= 0:
+        return 1.0
+
+    prefix = a * log(x) - x - lgamma(a)
+
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+
+        return max(1 - total * exp(prefix), 0.0)
+
+    # modified Lentz's method
+    tiny = 1e-300
+    b = x + 1 - a
+    c, d = 1 / tiny, 1 / b
+    h = d
+
+    for i in range(1, 100000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+
+        if abs(delta - 1) < 1e-15:
+            break
+
+    return exp(prefix) * h
+
+
+def normal_cdf(x: np.ndarray) -> np.ndarray:
+    return 0.5 * np.frompyfunc(erfc, 1, 1)(-np.asarray(x, dtype=float) / sqrt(2)).astype(float)
+
+
+class NistTests:
+    """
+    Vectorized subset of the NIST SP 800-22 statistical tests. Every test takes a series of bools or packed
+    bytes (bytes, bytearray or an uint8 array as returned by `BBS.generate`) and returns whether the series
+    passed at the 0.01 significance level together with the p-value.
+    """
+
+    @staticmethod
+    def bits(series: Union[list[bool], bytes, bytearray, np.ndarray]) -> np.ndarray:
+        """
+        Convert a series into an uint8 array of zeros and ones.
+        """
+        if isinstance(series, (bytes, bytearray, memoryview)):
+            return np.unpackbits(np.frombuffer(series, dtype=np.uint8))
+
+        if isinstance(series, np.ndarray) and series.dtype == np.uint8:
+            return np.unpackbits(series)
+
+        return np.asarray(series, dtype=bool).view(np.uint8)
+
+    @staticmethod
+    def patterns(bits: np.ndarray, m: int) -> np.ndarray:
+        """
+        Counts of all overlapping m bit patterns (m <= 25), the series wraps around at its end.
+        The windows are read from big endian 32 bit words built at every byte, one bit offset at a time.
+        """
+        if m == 0:
+            return np.array([len(bits)])
+
+        n = len(bits)
+        packed = np.packbits(np.concatenate((bits, bits[:m - 1]), dtype=np.uint8), bitorder='big')
+        packed = np.concatenate((packed, np.zeros(4, dtype=np.uint8))).astype(np.uint32)
+        words = packed[:-3] << 24 | packed[1:-2] << 16 | packed[2:-1] << 8 | packed[3:]
+
+        counts = np.zeros(1 << m, dtype=np.int64)
+
+        for offset in range(min(8, n)):
+            windows = words[:(n - offset + 7) // 8]
+            counts += np.bincount((windows >> (32 - m - offset)) & ((1 << m) - 1), minlength=1 << m)
+
+        return counts
+
+    @staticmethod
+    def block_frequency(series, block_size: int = 128) -> (bool, float):
+        bits = NistTests.bits(series)
+        blocks = len(bits) // block_size
+
+        proportions = bits[:blocks * block_size].reshape(blocks, block_size).sum(axis=1) / block_size
+        chi_squared = 4 * block_size * ((proportions - 0.5) ** 2).sum()
+        p_value = igamc(blocks / 2, chi_squared / 2)
+
+        return p_value >= SIGNIFICANCE, p_value
+
+    @staticmethod
+    def runs(series) -> (bool, float):
+        bits = NistTests.bits(series)
+        n = len(bits)
+        pi = bits.sum() / n
+
+        if abs(pi - 0.5) >= 2 / sqrt(n):
+            return False, 0.0
+
+        observed = 1 + np.count_nonzero(bits[1:] != bits[:-1])
+        p_value = erfc(abs(observed - 2 * n * pi * (1 - pi)) / (2 * sqrt(2 * n) * pi * (1 - pi)))
+
+        return p_value >= SIGNIFICANCE, p_value
+
+    @staticmethod
+    def longest_run(series) -> (bool, float):
+        """
+        Longest run of ones in a block, the block length depends on the series length (at least 128 bits).
+
+        :raises ValueError: When the series is shorter than 128 bits.
+        """
+        bits = NistTests.bits(series)
+        minimum = LONGEST_RUN_PARAMETERS[-1][0]
+
+        if len(bits) < minimum:
+            raise ValueError(f"the longest run test needs at least {minimum} bits, the series has {len(bits)}")
+
+        _, block_size, bounds, probabilities = next(p for p in LONGEST_RUN_PARAMETERS if len(bits) >= p[0])
+        blocks = len(bits) // block_size
+
+        # runs of ones start at +1 and end at -1 steps of the zero padded blocks
+        padded = np.zeros((blocks, block_size + 2), dtype=np.int8)
+        padded[:, 1:-1] = bits[:blocks * block_size].reshape(blocks, block_size)
+        steps = np.diff(padded, axis=1)
+
+        starts = np.flatnonzero(steps == 1)
+        lengths = np.flatnonzero(steps == -1) - starts
+        runs = np.bincount(starts // (block_size + 1), minlength=blocks)
+
+        longest = np.zeros(blocks, dtype=np.int64)
+        if len(lengths):
+            longest[runs > 0] = np.maximum.reduceat(lengths, (np.cumsum(runs) - runs)[runs > 0])
+
+        observed = np.bincount(np.searchsorted(bounds, longest), minlength=len(probabilities))
+        expected = blocks * np.array(probabilities)
+        chi_squared = ((observed - expected) ** 2 / expected).sum()
+        p_value = igamc((len(probabilities) - 1) / 2, chi_squared / 2)
+
+        return p_value >= SIGNIFICANCE, p_value
+
+    @staticmethod
+    def serial(series, m: int = None) -> (bool, (float, float)):
+        """
+        Frequency of all overlapping m bit patterns, the default m is floor(log2(n)) - 3, at most 16.
+        """
+        bits = NistTests.bits(series)
+        n = len(bits)
+        m = m or max(3, min(16, floor(log2(n)) - 3))
+
+        # with the wrap around every shorter pattern is the prefix of exactly two longer ones
+        counts = [NistTests.patterns(bits, m)]
+        counts += [counts[0].reshape(-1, 2).sum(axis=1), counts[0].reshape(-1, 4).sum(axis=1)]
+
+        psi = [(1 << k) / n * (c.astype(np.float64) ** 2).sum() - n if k else 0.0
+               for (k, c) in zip((m, m - 1, m - 2), counts)]
+
+        p_value1 = igamc(2 ** (m - 2), (psi[0] - psi[1]) / 2)
+        p_value2 = igamc(2 ** (m - 3), (psi[0] - 2 * psi[1] + psi[2]) / 2)
+
+        return min(p_value1, p_value2) >= SIGNIFICANCE, (p_value1, p_value2)
+
+    @staticmethod
+    def approximate_entropy(series, m: int = None) -> (bool, float):
+        """
+        Compares the frequencies of overlapping m and m + 1 bit patterns,
+        the default m is floor(log2(n)) - 6, at most 10.
+        """
+        bits = NistTests.bits(series)
+        n = len(bits)
+        m = m or max(2, min(10, floor(log2(n)) - 6))
+
+        def phi(counts: np.ndarray) -> float:
+            frequencies = counts[counts > 0] / n
+
+            return (frequencies * np.log(frequencies)).sum()
+
+        longer = NistTests.patterns(bits, m + 1)
+        chi_squared = 2 * n * (log(2) - (phi(longer.reshape(-1, 2).sum(axis=1)) - phi(longer)))
+        p_value = igamc(2 ** (m - 1), chi_squared / 2)
+
+        return p_value >= SIGNIFICANCE, p_value
+
+    @staticmethod
+    def cumulative_sums(series) -> (bool, (float, float)):
+        """
+        Maximal excursion of the random walk of the series, both forward and backward.
+
+        :return: pass flag and p-values of both directions
+        """
+        bits = NistTests.bits(series)
+        n = len(bits)
+        walk = np.cumsum(2 * bits.astype(np.int32) - 1)
+        total, low, high = int(walk[-1]), int(walk.min()), int(walk.max())
+
+        # the backward walk visits total - S_j for j = 0 .. n - 1, so its extremes follow from the forward one
+        inner_low, inner_high = (int(walk[:-1].min()), int(walk[:-1].max())) if n > 1 else (0, 0)
+        excursions = (max(high, -low, 1), max(abs(total), total - min(inner_low, 0), max(inner_high, 0) - total, 1))
+
+        p_values = []
+
+        for z in excursions:
+            k = np.arange((-n // z + 1) // 4, (n // z - 1) // 4 + 1)
+            first = (normal_cdf((4 * k + 1) * z / sqrt(n)) - normal_cdf((4 * k - 1) * z / sqrt(n))).sum()
+
+            k = np.arange((-n // z - 3) // 4, (n // z - 1) // 4 + 1)
+            second = (normal_cdf((4 * k + 3) * z / sqrt(n)) - normal_cdf((4 * k + 1) * z / sqrt(n))).sum()
+
+            p_values.append(min(max(1 - first + second, 0.0), 1.0))
+
+        return min(p_values) >= SIGNIFICANCE, tuple(p_values)
+
+    @staticmethod
+    def spectral(series) -> (bool, float):
+        """
+        Discrete Fourier transform test, detects periodic features of the series.
+        """
+        bits = NistTests.bits(series)
+        n = len(bits)
+
+        moduli = np.abs(np.fft.rfft(2 * bits.astype(np.float32) - 1)[:n // 2])
+        threshold = sqrt(log(1 / 0.05) * n)
+
+        expected = 0.95 * n / 2
+        observed = np.count_nonzero(moduli < threshold)
+        d = (observed - expected) / sqrt(n * 0.95 * 0.05 / 4)
+        p_value = erfc(abs(d) / sqrt(2))
+
+        return p_value >= SIGNIFICANCE, p_value
+
+    @staticmethod
+    def results(series) -> dict[str, tuple]:
+        """
+        Run all of the tests, converting the series into bits only once.
+        """
+        bits = NistTests.bits(series).view(bool)
+
+        return {'block_frequency': NistTests.block_frequency(bits),
+                'runs': NistTests.runs(bits),
+                'longest_run': NistTests.longest_run(bits),
+                'serial': NistTests.serial(bits),
+                'approximate_entropy': NistTests.approximate_entropy(bits),
+                'cumulative_sums': NistTests.cumulative_sums(bits),
+                'spectral': NistTests.spectral(bits)}
+
+    @staticmethod
+    def test(series) -> None:
+        assert all(passed for (passed, _) in NistTests.results(series).values()), "one of the tests didn't pass"
+
+    @staticmethod
+    def test_visual(series) -> None:
+        results = NistTests.results(series)
+
+        print(f'Block frequency     = {results["block_frequency"][0]} => {results["block_frequency"][1]}')
+        print(f'Runs                = {results["runs"][0]} => {results["runs"][1]}')
+        print(f'Longest run         = {results["longest_run"][0]} => {results["longest_run"][1]}')
+        print(f'Serial              = {results["serial"][0]} => {results["serial"][1]}')
+        print(f'Approximate entropy = {results["approximate_entropy"][0]} => {results["approximate_entropy"][1]}')
+        print(f'Cumulative sums     = {results["cumulative_sums"][0]} => {results["cumulative_sums"][1]}')
+        print(f'Spectral            = {results["spectral"][0]} => {results["spectral"][1]}')
+
+
+if __name__ == '__main__':
+    series = BBS.generate(20000)
+
+    NistTests.test_visual(series)
+    NistTests.test(series)
@@ -0,0 +1,175 @@
+import argparse as argp
+import os
+import threading
+from contextlib import contextmanager
+from itertools import repeat
+from multiprocessing import Pool
+from typing import Any, Iterator
+
+from lab3.bbs import BBS
+
+try:
+    import fcntl
+except ImportError:  # no inter-process locking outside of unix, the in-process lock still applies
+    fcntl = None
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.pod-lab', 'primes')
+
+
+class PrimePool:
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, refill_count: int = 16, low_watermark: int = 4,
+                 workers: int = None):
+        """
+        On-disk pool of verified primes keyed by bit size and congruence class, refilled in the background.
+        Every taken prime is removed from the pool, so no two jobs get the same one.
+
+        :param directory: directory holding one file of primes per key
+        :param refill_count: amount of primes searched by a refill
+        :param low_watermark: pool size below which taking a prime starts a background refill
+        :param workers: amount of processes searching for primes, the default is the cpu count
+        """
+        self.directory = directory
+        self.refill_count = refill_count
+        self.low_watermark = low_watermark
+        self.workers = workers
+
+        self.__lock = threading.Lock()
+        self.__refills: dict[tuple[int, int, int], threading.Thread] = {}
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, bit_size: int, residue: int = 1, modulus: int = 2) -> str:
+        return os.path.join(self.directory, f'{bit_size}_{residue}_{modulus}.txt')
+
+    @contextmanager
+    def __locked(self, path: str) -> Iterator[None]:
+        """
+        Hold the pool file exclusively, against other threads and other processes.
+        """
+        with self.__lock, open(path + '.lock', 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def search(bit_size: int, count: int, residue: int = 1, modulus: int = 2, workers: int = None) -> list[int]:
+        """
+        Search for primes concurrently in a process pool. Its workers are daemonic, so a search left running by
+        a background refill is stopped at the interpreter exit instead of holding it up.
+
+        :param bit_size: exact bit size of the primes
+        :param count: amount of primes to find
+        :param residue: residue class of the primes (ex. 3 for Blum primes)
+        :param modulus: modulus of the residue class (ex. 4 for Blum primes)
+        :param workers: amount of worker processes, the default is the cpu count
+        """
+        if count <= 0:
+            return []
+
+        with Pool(workers) as pool:
+            return pool.starmap(BBS.sieved_prime, zip(repeat(bit_size, count), repeat(40), repeat(residue),
+                                                      repeat(modulus)))
+
+    def size(self, bit_size: int, residue: int = 1, modulus: int = 2) -> int:
+        path = self.path(bit_size, residue, modulus)
+
+        with self.__locked(path):
+            return len(self.__read(path))
+
+    def add(self, bit_size: int, primes: list[int], residue: int = 1, modulus: int = 2) -> None:
+        path = self.path(bit_size, residue, modulus)
+
+        with self.__locked(path):
+            with open(path, 'a') as f:
+                f.writelines(f'{prime:x}\n' for prime in primes)
+
+    def take(self, bit_size: int, count: int = 1, residue: int = 1, modulus: int = 2) -> list[int]:
+        """
+        Take primes out of the pool, the missing ones are searched on the spot.
+        A background refill starts when the pool runs low.
+
+        :param bit_size: exact bit size of the primes
+        :param count: amount of primes to take
+        :param residue: residue class of the primes (ex. 3 for Blum primes)
+        :param modulus: modulus of the residue class (ex. 4 for Blum primes)
+        """
+        path = self.path(bit_size, residue, modulus)
+
+        with self.__locked(path):
+            stored = self.__read(path)
+            taken, left = stored[:count], stored[count:]
+
+            # written aside and renamed, so a crash or a reader never sees a partial pool
+            with open(f'{path}.{os.getpid()}.tmp', 'w') as f:
+                f.writelines(f'{prime:x}\n' for prime in left)
+
+            os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+        if len(left) < self.low_watermark:
+            self.refill_in_background(bit_size, residue, modulus)
+
+        return taken + PrimePool.search(bit_size, count - len(taken), residue, modulus, self.workers)
+
+    def refill(self, bit_size: int, residue: int = 1, modulus: int = 2, count: int = None) -> None:
+        self.add(bit_size, PrimePool.search(bit_size, count or self.refill_count, residue, modulus, self.workers),
+                 residue, modulus)
+
+    def refill_in_background(self, bit_size: int, residue: int = 1, modulus: int = 2) -> threading.Thread:
+        """
+        Start a refill thread for the key, unless one is already running. The thread doesn't keep the interpreter
+        alive, an unfinished refill is dropped at exit (the pool file only changes once the search is done),
+        call `wait` to let it finish.
+        """
+        key = (bit_size, residue, modulus)
+
+        with self.__lock:
+            if (thread := self.__refills.get(key)) and thread.is_alive():
+                return thread
+
+            thread = threading.Thread(target=self.refill, args=key, name=f'prime-pool-refill-{bit_size}', daemon=True)
+            self.__refills[key] = thread
+            thread.start()
+
+        return thread
+
+    def wait(self) -> None:
+        """
+        Wait for all of the background refills to finish.
+        """
+        for thread in list(self.__refills.values()):
+            thread.join()
+
+    @staticmethod
+    def __read(path: str) -> list[int]:
+        if not os.path.exists(path):
+            return []
+
+        with open(path, 'r') as f:
+            return [int(line, 16) for line in f if line.strip()]
+
+
+def get_command_line_args() -> dict[str, Any]:
+    parser = argp.ArgumentParser(description="Fill the on-disk prime pool.")
+
+    parser.add_argument('--bits', type=int, nargs='+', metavar='N', help='bit sizes of the primes', required=True)
+    parser.add_argument('--count', type=int, default=16, help='amount of primes to add per bit size')
+    parser.add_argument('--blum', action='store_true', help='search for Blum primes (3 mod 4)')
+    parser.add_argument('--dir', type=str, metavar='DIRECTORY', default=DEFAULT_DIRECTORY, help='pool directory')
+    parser.add_argument('--workers', type=int, metavar='N', help='amount of searching processes')
+
+    return vars(parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = get_command_line_args()
+    pool = PrimePool(args['dir'], workers=args['workers'])
+    residue, modulus = (3, 4) if args['blum'] else (1, 2)
+
+    for bits in args['bits']:
+        pool.refill(bits, residue, modulus, args['count'])
+        print(f'{bits} bit pool ({residue} mod {modulus}) = {pool.size(bits, residue, modulus)} primes')
@@ -1,6 +1,13 @@
+import os
+from typing import Iterator, Optional, Sequence, Union
+
+import numpy as np
 from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
 from Cryptodome.Util import Padding
 
+BUFFER_SIZE = 1 << 20
+
 
 def to_paded_bytes(raw: str, block_size: int = 32) -> bytes:
     return Padding.pad(bytes(raw, 'utf8'), block_size)
@@ -10,7 +17,497 @@ def unpad(raw: bytes, block_size: int = 32) -> bytes:
     return Padding.unpad(raw, block_size)
 
 
-class ECB:
+def to_key_bytes(key: Union[str, bytes]) -> bytes:
+    return key.encode('utf8') if isinstance(key, str) else bytes(key)
+
+
+def padding_size(plain: memoryview, block_size: int) -> int:
+    """
+    Size of the PKCS#7 padding at the end of a decrypted buffer.
+
+    :raises ValueError: When the padding is incorrect.
+    """
+    size = plain[-1] if len(plain) else 0
+
+    if not 0 < size <= min(block_size, len(plain)) or plain[len(plain) - size:] != bytes([size]) * size:
+        raise ValueError("Padding is incorrect.")
+
+    return size
+
+
+def byte_view(array: np.ndarray) -> memoryview:
+    """
+    Flat writable byte view of a numpy array, the form accepted by the Pycryptodome `output` parameter.
+    """
+    return memoryview(np.ascontiguousarray(array).reshape(-1))
+
+
+def spans(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Concatenated indexes of the ranges [start, start + length), the vectorized gather of many slices.
+    """
+    return np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+
+
+def drop_spans(array: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Copy of the array without the ranges [start, start + length), meant for short ranges like paddings.
+    """
+    keep = np.ones(len(array), bool)
+    keep[spans(starts, lengths)] = False
+
+    return array[keep]
+
+
+def block_columns(counts: np.ndarray) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Walk the messages block by block, yields the block index and the messages having such a block.
+
+    :param counts: amount of blocks of every message
+    """
+    order = np.argsort(-counts, kind='stable')
+    descending = -counts[order]
+
+    for column in range(-descending[0] if len(counts) else 0):
+        yield column, order[:np.searchsorted(descending, -column)]
+
+
+class MessageBatch:
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, ivs: Optional[np.ndarray] = None):
+        """
+        Messages stored back to back in one contiguous buffer.
+
+        :param buffer: numpy array of bytes holding all the messages
+        :param offsets: numpy array of the message boundaries, message i is buffer[offsets[i]:offsets[i + 1]]
+        :param ivs: numpy array with the iv or nonce of every message in a row, None for ECB
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+        self.ivs = ivs
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def iv(self, index: int) -> Optional[bytes]:
+        return self.ivs[index].tobytes() if self.ivs is not None else None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> memoryview:
+        return byte_view(self.buffer)[self.offsets[index]:self.offsets[index + 1]]
+
+
+class StreamEncryptor:
+    def __init__(self, cipher, padding: int = 0):
+        """
+        Incremental encryption, the data may be passed in chunks of any size.
+
+        :param cipher: Pycryptodome cipher object
+        :param padding: block size of the PKCS#7 padding appended by `finalize`, 0 for the modes without padding
+        """
+        self.cipher = cipher
+        self.padding = padding
+
+        self.__pending = b''
+        self.__length = 0
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Encrypt the next chunk, the padded modes keep the incomplete block for the next call.
+        """
+        if not self.padding:
+            return self.cipher.encrypt(data)
+
+        self.__length += len(data)
+        data = self.__pending + bytes(data)
+        ready = len(data) - len(data) % AES.block_size
+
+        self.__pending = data[ready:]
+
+        return self.cipher.encrypt(data[:ready])
+
+    def finalize(self) -> bytes:
+        """
+        Pad and encrypt what is left, the encryptor can't be updated afterwards.
+        """
+        if not self.padding:
+            return b''
+
+        size = self.padding - self.__length % self.padding
+        tail, self.__pending = self.__pending + bytes([size]) * size, b''
+
+        return self.cipher.encrypt(tail)
+
+
+class StreamDecryptor:
+    def __init__(self, cipher, padding: int = 0):
+        """
+        Incremental decryption, the data may be passed in chunks of any size.
+
+        :param cipher: Pycryptodome cipher object
+        :param padding: block size of the PKCS#7 padding removed by `finalize`, 0 for the modes without padding
+        """
+        self.cipher = cipher
+        self.padding = padding
+
+        self.__pending = b''
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Decrypt the next chunk, the padded modes hold back the last padding block until `finalize`.
+        """
+        if not self.padding:
+            return self.cipher.decrypt(data)
+
+        data = self.__pending + bytes(data)
+        ready = max(len(data) - self.padding, 0)
+        ready -= ready % AES.block_size
+
+        self.__pending = data[ready:]
+
+        return self.cipher.decrypt(data[:ready])
+
+    def finalize(self) -> bytes:
+        """
+        Decrypt what is left and remove the padding.
+
+        :raises ValueError: When the padding is incorrect.
+        """
+        if not self.padding:
+            return b''
+
+        tail, self.__pending = self.cipher.decrypt(self.__pending), b''
+
+        return Padding.unpad(tail, self.padding)
+
+
+class AeadEncryptor:
+    def __init__(self, cipher, streaming: bool = True, flush: bool = False):
+        """
+        Incremental authenticated encryption, `finalize` appends the tag to the ciphertext.
+
+        :param cipher: Pycryptodome AEAD cipher object
+        :param streaming: False for the modes which need the whole message at once (SIV),
+                          the data is then buffered until `finalize`
+        :param flush: the mode caches blocks and needs a final call without data (OCB)
+        """
+        self.cipher = cipher
+        self.streaming = streaming
+        self.flush = flush
+
+        self.__pending = bytearray()
+
+    def update(self, data: bytes) -> bytes:
+        if self.streaming:
+            return self.cipher.encrypt(bytes(data))
+
+        self.__pending += data
+
+        return b''
+
+    def finalize(self) -> bytes:
+        """
+        Encrypt what is left and append the tag, the encryptor can't be updated afterwards.
+        """
+        if not self.streaming:
+            ciphertext, tag = self.cipher.encrypt_and_digest(bytes(self.__pending))
+            self.__pending = bytearray()
+
+            return ciphertext + tag
+
+        return (self.cipher.encrypt() if self.flush else b'') + self.cipher.digest()
+
+
+class AeadDecryptor:
+    def __init__(self, cipher, streaming: bool = True, flush: bool = False, tag_size: int = 16):
+        """
+        Incremental authenticated decryption of a ciphertext followed by its tag.
+        The plain text returned by `update` isn't authentic until `finalize` succeeds.
+
+        :param cipher: Pycryptodome AEAD cipher object
+        :param streaming: False for the modes which need the whole message at once (SIV)
+        :param flush: the mode caches blocks and needs a final call without data (OCB)
+        :param tag_size: size of the tag at the end of the ciphertext
+        """
+        self.cipher = cipher
+        self.streaming = streaming
+        self.flush = flush
+        self.tag_size = tag_size
+
+        self.__pending = bytearray()
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Decrypt the next chunk, the last `tag_size` bytes are held back as the possible tag.
+        """
+        self.__pending += data
+
+        if not self.streaming or len(self.__pending) <= self.tag_size:
+            return b''
+
+        ready = len(self.__pending) - self.tag_size
+        plain = self.cipher.decrypt(bytes(self.__pending[:ready]))
+        del self.__pending[:ready]
+
+        return plain
+
+    def finalize(self) -> bytes:
+        """
+        Decrypt what is left and verify the tag.
+
+        :raises ValueError: When the ciphertext or the associated data was modified.
+        """
+        if len(self.__pending) < self.tag_size:
+            raise ValueError("MAC check failed")
+
+        ciphertext, tag = bytes(self.__pending[:-self.tag_size]), bytes(self.__pending[-self.tag_size:])
+        self.__pending = bytearray()
+
+        if not self.streaming:
+            return self.cipher.decrypt_and_verify(ciphertext, tag)
+
+        plain = self.cipher.decrypt() if self.flush else b''
+        self.cipher.verify(tag)
+
+        return plain
+
+
+class Mode:
+    """
+    Common streaming interface of the AES modes.
+    """
+    MODE: int = None
+    PADDING: int = 0
+    IV: Optional[str] = None
+    KEY_SIZE: int = 16
+
+    @classmethod
+    def new_cipher(cls, key: Union[str, bytes], iv: bytes = None):
+        """
+        Create the Pycryptodome cipher object, with a random iv or nonce when not given.
+        """
+        params = {cls.IV: iv} if cls.IV and iv is not None else {}
+
+        return AES.new(to_key_bytes(key), cls.MODE, **params)
+
+    @classmethod
+    def iv_of(cls, cipher) -> Optional[bytes]:
+        """
+        Initialization vector or nonce of the cipher, None for the modes without one.
+        """
+        return getattr(cipher, cls.IV) if cls.IV else None
+
+    @classmethod
+    def output_size(cls, length: int) -> int:
+        """
+        Size of the ciphertext of a message with given length.
+        """
+        return length + cls.PADDING - length % cls.PADDING if cls.PADDING else length
+
+    @classmethod
+    def encrypt_into(cls, data, key: Union[str, bytes], output=None, iv: bytes = None) -> (memoryview, Optional[bytes]):
+        """
+        Encrypt any buffer-protocol object straight into the output buffer, only the last padded block is copied.
+
+        :param data: bytes, bytearray, memoryview, numpy array or any other contiguous buffer
+        :param key: key as string or bytes
+        :param output: writable buffer of at least `output_size(len(data))` bytes (may be the input itself),
+                       allocated when not given
+        :param iv: iv or nonce of the cipher, random when not given
+        :return: view of the ciphertext in the output buffer and the iv or nonce of the cipher (None for ECB)
+        """
+        data = memoryview(data).cast('B')
+        size = cls.output_size(len(data))
+        output = memoryview(output if output is not None else bytearray(size)).cast('B')
+
+        if len(output) < size:
+            raise ValueError(f"the output buffer must hold at least {size} bytes")
+
+        cipher = cls.new_cipher(key, iv)
+        full = len(data) - len(data) % AES.block_size if cls.PADDING else len(data)
+
+        if full:
+            cipher.encrypt(data[:full], output=output[:full])
+
+        if cls.PADDING:
+            tail = bytearray(size - full)
+            tail[:len(data) - full] = data[full:]
+            tail[len(data) - full:] = bytes([size - len(data)]) * (size - len(data))
+
+            cipher.encrypt(tail, output=output[full:size])
+
+        return output[:size], cls.iv_of(cipher)
+
+    @classmethod
+    def decrypt_into(cls, data, key: Union[str, bytes], output=None, iv: bytes = None,
+                     unpad: bool = True) -> memoryview:
+        """
+        Decrypt any buffer-protocol object straight into the output buffer, the padding is cut off the view only.
+
+        :param data: bytes, bytearray, memoryview, numpy array or any other contiguous buffer
+        :param key: key as string or bytes
+        :param output: writable buffer of at least `len(data)` bytes (may be the input itself), allocated when not given
+        :param iv: iv or nonce used by the cipher
+        :param unpad: remove the padding of the padded modes
+        :return: view of the plain text in the output buffer
+        :raises ValueError: When the padding is incorrect.
+        """
+        data = memoryview(data).cast('B')
+        output = memoryview(output if output is not None else bytearray(len(data))).cast('B')
+
+        if len(output) < len(data):
+            raise ValueError(f"the output buffer must hold at least {len(data)} bytes")
+
+        cls.new_cipher(key, iv).decrypt(data, output=output[:len(data)])
+
+        if not (cls.PADDING and unpad):
+            return output[:len(data)]
+
+        return output[:len(data) - padding_size(output[:len(data)], cls.PADDING)]
+
+    @classmethod
+    def encrypt_batch(cls, messages: Sequence[Union[str, bytes]], key: Union[str, bytes],
+                      ivs: Sequence[bytes] = None) -> MessageBatch:
+        """
+        Encrypt many messages under one key, every ciphertext decrypts on its own with `decrypt_into`.
+        The key is expanded once and the whole batch is padded and encrypted in a few numpy passes.
+
+        :param messages: sequence of strings or bytes
+        :param key: key as string or bytes
+        :param ivs: iv or nonce of every message, random when not given
+        :return: batch of the ciphertexts with their ivs or nonces
+        """
+        messages = [m.encode('utf8') if isinstance(m, str) else m for m in messages]
+        lengths = np.fromiter(map(len, messages), np.int64, len(messages))
+
+        if cls.PADDING:
+            paddings = [bytes([size]) * size for size in range(cls.PADDING + 1)]
+            sizes = lengths + cls.PADDING - lengths % cls.PADDING
+            data = b''.join([part for message, size in zip(messages, (sizes - lengths).tolist())
+                             for part in (message, paddings[size])])
+        else:
+            sizes = lengths
+            data = b''.join(messages)
+
+        if ivs is not None and len(messages):
+            ivs = np.frombuffer(b''.join(ivs), np.uint8).reshape(len(messages), -1)
+        elif cls.IV:
+            size = 8 if cls.IV == 'nonce' else AES.block_size
+            ivs = np.frombuffer(get_random_bytes(size * len(messages)), np.uint8).reshape(len(messages), size)
+
+        buffer = np.frombuffer(data, np.uint8).copy()
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+        if len(messages):
+            cls.transform_batch(to_key_bytes(key), buffer, offsets, ivs, decrypt=False)
+
+        return MessageBatch(buffer, offsets, ivs)
+
+    @classmethod
+    def decrypt_batch(cls, batch: MessageBatch, key: Union[str, bytes], unpad: bool = True) -> MessageBatch:
+        """
+        Decrypt a batch of ciphertexts under one key.
+
+        :param batch: batch of the ciphertexts with their ivs or nonces
+        :param key: key as string or bytes
+        :param unpad: remove the padding of the padded modes
+        :return: batch of the plain texts
+        :raises ValueError: When the padding of any message is incorrect.
+        """
+        buffer = batch.buffer.copy()
+
+        if len(batch):
+            cls.transform_batch(to_key_bytes(key), buffer, batch.offsets, batch.ivs, decrypt=True)
+
+        if not (cls.PADDING and unpad):
+            return MessageBatch(buffer, batch.offsets.copy(), batch.ivs)
+
+        lengths = batch.lengths
+        padding = np.zeros(len(batch), np.int64)
+        padding[lengths > 0] = buffer[batch.offsets[1:][lengths > 0] - 1]
+
+        if np.any((padding == 0) | (padding > np.minimum(lengths, cls.PADDING))):
+            raise ValueError("Padding is incorrect.")
+
+        if np.any(buffer[spans(batch.offsets[1:] - padding, padding)] != np.repeat(padding, padding)):
+            raise ValueError("Padding is incorrect.")
+
+        return MessageBatch(drop_spans(buffer, batch.offsets[1:] - padding, padding),
+                            np.concatenate(([0], np.cumsum(lengths - padding))), batch.ivs)
+
+    @classmethod
+    def transform_batch(cls, key: bytes, buffer: np.ndarray, offsets: np.ndarray, ivs: Optional[np.ndarray],
+                        decrypt: bool) -> None:
+        """
+        Encrypt or decrypt the padded messages of the buffer in place, a cipher object per message.
+        The modes which can share one cipher override it.
+        """
+        view = byte_view(buffer)
+
+        for i, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            cipher = cls.new_cipher(key, ivs[i].tobytes() if ivs is not None else None)
+            (cipher.decrypt if decrypt else cipher.encrypt)(view[start:end], output=view[start:end])
+
+    @classmethod
+    def encryptor(cls, key: Union[str, bytes], iv: bytes = None) -> StreamEncryptor:
+        return StreamEncryptor(cls.new_cipher(key, iv), cls.PADDING)
+
+    @classmethod
+    def decryptor(cls, key: Union[str, bytes], iv: bytes = None) -> StreamDecryptor:
+        return StreamDecryptor(cls.new_cipher(key, iv), cls.PADDING)
+
+    @staticmethod
+    def transform_file(transform: Union[StreamEncryptor, StreamDecryptor], source: str, target: str,
+                       buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        Pass a file through an encryptor or decryptor using one reusable read buffer.
+        """
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            while size := src.readinto(buffer):
+                dst.write(transform.update(view[:size]))
+
+            dst.write(transform.finalize())
+
+    @classmethod
+    def encrypt_file(cls, source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                     buffer_size: int = BUFFER_SIZE) -> Optional[bytes]:
+        """
+        Encrypt a file of any size in constant memory.
+
+        :return: iv or nonce of the cipher, None for ECB
+        """
+        encryptor = cls.encryptor(key, iv)
+        Mode.transform_file(encryptor, source, target, buffer_size)
+
+        return cls.iv_of(encryptor.cipher)
+
+    @classmethod
+    def decrypt_file(cls, source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                     buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        Decrypt a file of any size in constant memory.
+        """
+        Mode.transform_file(cls.decryptor(key, iv), source, target, buffer_size)
+
+
+class ECB(Mode):
+    MODE = AES.MODE_ECB
+    PADDING = 32
+
+    @classmethod
+    def transform_batch(cls, key: bytes, buffer: np.ndarray, offsets: np.ndarray, ivs: Optional[np.ndarray],
+                        decrypt: bool) -> None:
+        """
+        The blocks are independent, so the whole padded batch goes through one cipher call.
+        """
+        cipher = AES.new(key, AES.MODE_ECB)
+        (cipher.decrypt if decrypt else cipher.encrypt)(byte_view(buffer), output=byte_view(buffer))
+
     @staticmethod
     def encrypt(raw: str, key: str) -> bytes:
         """
@@ -19,11 +516,7 @@ class ECB:
         :param key: key as string
         :return: encrypted message as bytes
         """
-        data_bytes = to_paded_bytes(raw)
-        key_bytes = key.encode('utf8')
-
-        cipher = AES.new(key_bytes, AES.MODE_ECB)
-        return cipher.encrypt(data_bytes)
+        return bytes(ECB.encrypt_into(raw.encode('utf8'), key)[0])
 
     @staticmethod
     def decrypt(ciphertext: bytes, key: str) -> str:
@@ -33,15 +526,42 @@ class ECB:
         :param key: key as string
         :return: decrypted message as string
         """
-        key_bytes = key.encode('utf8')
+        return str(bytes(ECB.decrypt_into(ciphertext, key)))
+
+
+class CBC(Mode):
+    MODE = AES.MODE_CBC
+    PADDING = 16
+    IV = 'iv'
+
+    @classmethod
+    def transform_batch(cls, key: bytes, buffer: np.ndarray, offsets: np.ndarray, ivs: Optional[np.ndarray],
+                        decrypt: bool) -> None:
+        """
+        Decryption is one ECB pass and a xor with the previous ciphertext blocks. Encryption chains the messages
+        side by side, one ECB call encrypts the n-th block of every message.
+        """
+        cipher = AES.new(key, AES.MODE_ECB)
+        blocks = buffer.reshape(-1, AES.block_size)
+        first = offsets[:-1] // AES.block_size
+
+        if decrypt:
+            previous = np.concatenate((blocks[:1], blocks[:-1]))
+            previous[first[first < len(blocks)]] = ivs[first < len(blocks)]
+            cipher.decrypt(byte_view(blocks), output=byte_view(blocks))
+            blocks ^= previous
+
+            return
 
-        decrypter = AES.new(key_bytes, AES.MODE_ECB)
-        result = decrypter.decrypt(ciphertext)
+        state = ivs.copy()
 
-        return str(unpad(result))
+        for column, messages in block_columns(np.diff(offsets) // AES.block_size):
+            indexes = first[messages] + column
+            chained = blocks[indexes] ^ state[messages]
+            cipher.encrypt(byte_view(chained), output=byte_view(chained))
 
+            blocks[indexes] = state[messages] = chained
 
-class CBC:
     @staticmethod
     def encrypt(raw: str, key: str) -> (bytes, bytes):
         """
@@ -50,11 +570,9 @@ class CBC:
         :param key: key as string
         :return: encrypted message as bytes and iv of the cipher
         """
-        data_bytes = to_paded_bytes(raw, 16)
-        key_bytes = key.encode('utf8')
+        ciphertext, iv = CBC.encrypt_into(raw.encode('utf8'), key)
 
-        cipher = AES.new(key_bytes, AES.MODE_CBC)
-        return cipher.encrypt(data_bytes), cipher.iv
+        return bytes(ciphertext), iv
 
     @staticmethod
     def decrypt(ciphertext: bytes, iv: bytes, key: str) -> str:
@@ -65,13 +583,34 @@ class CBC:
         :param key: key as string
         :return: decrypted message as string
         """
-        key_bytes = key.encode('utf8')
+        return str(bytes(CBC.decrypt_into(ciphertext, key, iv=iv, unpad=False)))
 
-        decrypter = AES.new(key_bytes, AES.MODE_CBC, iv=iv)
-        return str(decrypter.decrypt(ciphertext))
 
+class OFB(Mode):
+    MODE = AES.MODE_OFB
+    IV = 'iv'
+
+    @classmethod
+    def transform_batch(cls, key: bytes, buffer: np.ndarray, offsets: np.ndarray, ivs: Optional[np.ndarray],
+                        decrypt: bool) -> None:
+        """
+        The key streams of all messages are generated side by side, one ECB call per block of the longest message.
+        """
+        cipher = AES.new(key, AES.MODE_ECB)
+        counts = -(-np.diff(offsets) // AES.block_size)
+        first = np.cumsum(counts) - counts
+        keystream = np.empty((counts.sum(), AES.block_size), np.uint8)
+        state = ivs.copy()
+
+        for column, messages in block_columns(counts):
+            block = state[messages]
+            cipher.encrypt(byte_view(block), output=byte_view(block))
+
+            keystream[first[messages] + column] = state[messages] = block
+
+        ends = first * AES.block_size + np.diff(offsets)
+        buffer ^= drop_spans(keystream.reshape(-1), ends, (first + counts) * AES.block_size - ends)
 
-class OFB:
     @staticmethod
     def encrypt(raw: str, key: str) -> (bytes, bytes):
         """
@@ -80,11 +619,9 @@ class OFB:
         :param key: key as string
         :return: encrypted message as bytes and iv of the cipher
         """
-        data_bytes = raw.encode('utf8')
-        key_bytes = key.encode('utf8')
+        ciphertext, iv = OFB.encrypt_into(raw.encode('utf8'), key)
 
-        cipher = AES.new(key_bytes, AES.MODE_OFB)
-        return cipher.encrypt(data_bytes), cipher.iv
+        return bytes(ciphertext), iv
 
     @staticmethod
     def decrypt(ciphertext: bytes, iv: bytes, key: str) -> str:
@@ -95,13 +632,13 @@ class OFB:
         :param key: key as string
         :return: decrypted message as string
         """
-        key_bytes = key.encode('utf8')
+        return str(bytes(OFB.decrypt_into(ciphertext, key, iv=iv)))
 
-        decrypter = AES.new(key_bytes, AES.MODE_OFB, iv=iv)
-        return str(decrypter.decrypt(ciphertext))
 
+class CFB(Mode):
+    MODE = AES.MODE_CFB
+    IV = 'iv'
 
-class CFB:
     @staticmethod
     def encrypt(raw: str, key: str) -> (bytes, bytes):
         """
@@ -110,11 +647,9 @@ class CFB:
         :param key: key as string
         :return: encrypted message as bytes and iv of the cipher
         """
-        data_bytes = raw.encode('utf8')
-        key_bytes = key.encode('utf8')
+        ciphertext, iv = CFB.encrypt_into(raw.encode('utf8'), key)
 
-        cipher = AES.new(key_bytes, AES.MODE_CFB)
-        return cipher.encrypt(data_bytes), cipher.iv
+        return bytes(ciphertext), iv
 
     @staticmethod
     def decrypt(ciphertext: bytes, iv: bytes, key: str) -> str:
@@ -125,13 +660,32 @@ class CFB:
         :param key: key as string
         :return: decrypted message as string
         """
-        key_bytes = key.encode('utf8')
+        return str(bytes(CFB.decrypt_into(ciphertext, key, iv=iv)))
+
+
+class CTR(Mode):
+    MODE = AES.MODE_CTR
+    IV = 'nonce'
+
+    @classmethod
+    def transform_batch(cls, key: bytes, buffer: np.ndarray, offsets: np.ndarray, ivs: Optional[np.ndarray],
+                        decrypt: bool) -> None:
+        """
+        The counter blocks of all messages (nonce followed by a big endian block number) are encrypted
+        in one ECB call.
+        """
+        counts = -(-np.diff(offsets) // AES.block_size)
+        first = np.cumsum(counts) - counts
+        counters = np.empty((counts.sum(), AES.block_size), np.uint8)
+
+        counters[:, :8] = np.repeat(ivs, counts, axis=0)
+        counters[:, 8:] = (np.arange(len(counters)) - np.repeat(first, counts)).astype('>u8')[:, None].view(np.uint8)
 
-        decrypter = AES.new(key_bytes, AES.MODE_CFB, iv=iv)
-        return str(decrypter.decrypt(ciphertext))
+        AES.new(key, AES.MODE_ECB).encrypt(byte_view(counters), output=byte_view(counters))
 
+        ends = first * AES.block_size + np.diff(offsets)
+        buffer ^= drop_spans(counters.reshape(-1), ends, (first + counts) * AES.block_size - ends)
 
-class CTR:
     @staticmethod
     def encrypt(raw: str, key: str) -> (bytes, bytes):
         """
@@ -140,11 +694,9 @@ class CTR:
         :param key: key as string
         :return: encrypted message as bytes and nonce of the cipher
         """
-        data_bytes = raw.encode('utf8')
-        key_bytes = key.encode('utf8')
+        ciphertext, nonce = CTR.encrypt_into(raw.encode('utf8'), key)
 
-        cipher = AES.new(key_bytes, AES.MODE_CTR)
-        return cipher.encrypt(data_bytes), cipher.nonce
+        return bytes(ciphertext), nonce
 
     @staticmethod
     def decrypt(ciphertext: bytes, nonce: bytes, key: str) -> str:
@@ -155,7 +707,231 @@ class CTR:
         :param key: key as string
         :return: decrypted message as string
         """
-        key_bytes = key.encode('utf8')
+        return str(bytes(CTR.decrypt_into(ciphertext, key, iv=nonce)))
+
+
+class AeadMode(Mode):
+    """
+    Common interface of the authenticated modes, the tag is appended to the ciphertext
+    and the associated data is authenticated but not encrypted.
+    """
+    IV = 'nonce'
+    TAG_SIZE = 16
+    NONCE_SIZE: Optional[int] = None
+    STREAMING = True
+    FLUSH = False
+
+    @classmethod
+    def new_cipher(cls, key: Union[str, bytes], iv: bytes = None, associated_data: bytes = b''):
+        """
+        Create the Pycryptodome cipher object with the associated data, with a random nonce when not given.
+        """
+        if iv is None and cls.NONCE_SIZE:
+            iv = get_random_bytes(cls.NONCE_SIZE)
+
+        cipher = AES.new(to_key_bytes(key), cls.MODE, **({cls.IV: iv} if iv is not None else {}))
+
+        if associated_data:
+            cipher.update(associated_data)
+
+        return cipher
+
+    @classmethod
+    def output_size(cls, length: int) -> int:
+        return length + cls.TAG_SIZE
+
+    @classmethod
+    def encrypt_into(cls, data, key: Union[str, bytes], output=None, iv: bytes = None,
+                     associated_data: bytes = b'') -> (memoryview, bytes):
+        """
+        Encrypt any buffer-protocol object straight into the output buffer, followed by the tag.
+
+        :param data: bytes, bytearray, memoryview, numpy array or any other contiguous buffer
+        :param key: key as string or bytes
+        :param output: writable buffer of at least `output_size(len(data))` bytes, allocated when not given
+        :param iv: nonce of the cipher, random when not given
+        :param associated_data: data authenticated along with the message, but not encrypted
+        :return: view of the ciphertext and the tag in the output buffer and the nonce of the cipher
+        """
+        data = memoryview(data).cast('B')
+        size = cls.output_size(len(data))
+        output = memoryview(output if output is not None else bytearray(size)).cast('B')
+
+        if len(output) < size:
+            raise ValueError(f"the output buffer must hold at least {size} bytes")
+
+        cipher = cls.new_cipher(key, iv, associated_data)
+
+        if not cls.STREAMING:
+            _, tag = cipher.encrypt_and_digest(data, output=output[:len(data)])
+        elif cls.FLUSH:
+            output[:len(data)] = cipher.encrypt(data) + cipher.encrypt()
+            tag = cipher.digest()
+        else:
+            cipher.encrypt(data, output=output[:len(data)])
+            tag = cipher.digest()
+
+        output[len(data):size] = tag
+
+        return output[:size], cls.iv_of(cipher)
+
+    @classmethod
+    def decrypt_into(cls, data, key: Union[str, bytes], output=None, iv: bytes = None,
+                     associated_data: bytes = b'') -> memoryview:
+        """
+        Decrypt and verify any buffer-protocol object holding the ciphertext followed by the tag.
+
+        :param data: bytes, bytearray, memoryview, numpy array or any other contiguous buffer
+        :param key: key as string or bytes
+        :param output: writable buffer of at least `len(data) - TAG_SIZE` bytes, allocated when not given
+        :param iv: nonce used by the cipher
+        :param associated_data: data authenticated along with the message
+        :return: view of the plain text in the output buffer
+        :raises ValueError: When the ciphertext, the tag or the associated data was modified.
+        """
+        data = memoryview(data).cast('B')
+
+        if len(data) < cls.TAG_SIZE:
+            raise ValueError("MAC check failed")
+
+        size = len(data) - cls.TAG_SIZE
+        ciphertext, tag = data[:size], bytes(data[size:])
+        output = memoryview(output if output is not None else bytearray(size)).cast('B')
+
+        if len(output) < size:
+            raise ValueError(f"the output buffer must hold at least {size} bytes")
+
+        cipher = cls.new_cipher(key, iv, associated_data)
+
+        if not cls.STREAMING:
+            cipher.decrypt_and_verify(ciphertext, tag, output=output[:size])
+        elif cls.FLUSH:
+            output[:size] = cipher.decrypt(ciphertext) + cipher.decrypt()
+            cipher.verify(tag)
+        else:
+            cipher.decrypt(ciphertext, output=output[:size])
+            cipher.verify(tag)
+
+        return output[:size]
+
+    @classmethod
+    def encrypt(cls, raw: str, key: str, associated_data: bytes = b'') -> (bytes, bytes):
+        """
+        AES authenticated encryption using Pycryptodome
+        :param raw: string to encrypt
+        :param key: key as string
+        :param associated_data: data authenticated along with the message, but not encrypted
+        :return: encrypted message followed by the tag as bytes and nonce of the cipher
+        """
+        ciphertext, nonce = cls.encrypt_into(raw.encode('utf8'), key, associated_data=associated_data)
+
+        return bytes(ciphertext), nonce
+
+    @classmethod
+    def decrypt(cls, ciphertext: bytes, nonce: bytes, key: str, associated_data: bytes = b'') -> str:
+        """
+        AES authenticated decryption using Pycryptodome
+        :param ciphertext: bytes of the ciphertext followed by the tag
+        :param nonce: bytes of the nonce used by the cipher
+        :param key: key as string
+        :param associated_data: data authenticated along with the message
+        :return: decrypted message as string
+        :raises ValueError: When the ciphertext, the tag or the associated data was modified.
+        """
+        return str(bytes(cls.decrypt_into(ciphertext, key, iv=nonce, associated_data=associated_data)))
+
+    @classmethod
+    def encrypt_batch(cls, messages: Sequence[Union[str, bytes]], key: Union[str, bytes],
+                      ivs: Sequence[bytes] = None, associated_data: bytes = b'') -> MessageBatch:
+        """
+        Encrypt many messages under one key, the tag follows every ciphertext in the batch buffer.
+        The AEAD ciphers can't share the state between messages, so a cipher object is made per message.
+        """
+        messages = [m.encode('utf8') if isinstance(m, str) else m for m in messages]
+        sizes = np.fromiter(map(len, messages), np.int64, len(messages)) + cls.TAG_SIZE
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        buffer = np.empty(offsets[-1], np.uint8)
+        view, key = byte_view(buffer), to_key_bytes(key)
+        ivs = [bytes(iv) for iv in ivs] if ivs is not None else [None] * len(messages)
+
+        nonces = [cls.encrypt_into(message, key, view[start:end], iv, associated_data)[1]
+                  for message, iv, start, end in zip(messages, ivs, offsets[:-1], offsets[1:])]
+        ivs = np.frombuffer(b''.join(nonces), np.uint8).reshape(len(messages), -1) if messages else None
+
+        return MessageBatch(buffer, offsets, ivs)
+
+    @classmethod
+    def decrypt_batch(cls, batch: MessageBatch, key: Union[str, bytes], associated_data: bytes = b'') -> MessageBatch:
+        """
+        Decrypt and verify a batch of ciphertexts under one key.
+
+        :raises ValueError: When any message was modified.
+        """
+        offsets = batch.offsets - np.arange(len(batch.offsets)) * cls.TAG_SIZE
+        buffer = np.empty(offsets[-1], np.uint8)
+        view, key = byte_view(buffer), to_key_bytes(key)
+
+        for i in range(len(batch)):
+            cls.decrypt_into(batch[i], key, view[offsets[i]:offsets[i + 1]], batch.iv(i), associated_data)
+
+        return MessageBatch(buffer, offsets, batch.ivs)
+
+    @classmethod
+    def encryptor(cls, key: Union[str, bytes], iv: bytes = None, associated_data: bytes = b'') -> AeadEncryptor:
+        return AeadEncryptor(cls.new_cipher(key, iv, associated_data), cls.STREAMING, cls.FLUSH)
+
+    @classmethod
+    def decryptor(cls, key: Union[str, bytes], iv: bytes = None, associated_data: bytes = b'') -> AeadDecryptor:
+        return AeadDecryptor(cls.new_cipher(key, iv, associated_data), cls.STREAMING, cls.FLUSH, cls.TAG_SIZE)
+
+    @classmethod
+    def encrypt_file(cls, source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                     buffer_size: int = BUFFER_SIZE, associated_data: bytes = b'') -> bytes:
+        """
+        Encrypt a file of any size, the tag is written at the end of the target.
+        Constant memory except for SIV, which needs the whole message at once.
+
+        :return: nonce of the cipher
+        """
+        encryptor = cls.encryptor(key, iv, associated_data)
+        Mode.transform_file(encryptor, source, target, buffer_size)
+
+        return cls.iv_of(encryptor.cipher)
+
+    @classmethod
+    def decrypt_file(cls, source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                     buffer_size: int = BUFFER_SIZE, associated_data: bytes = b'') -> None:
+        """
+        Decrypt and verify a file of any size, the target is removed when the verification fails.
+
+        :raises ValueError: When the file or the associated data was modified.
+        """
+        try:
+            Mode.transform_file(cls.decryptor(key, iv, associated_data), source, target, buffer_size)
+        except ValueError:
+            os.remove(target)
+            raise
+
+
+class GCM(AeadMode):
+    MODE = AES.MODE_GCM
+
+
+class EAX(AeadMode):
+    MODE = AES.MODE_EAX
+
+
+class OCB(AeadMode):
+    MODE = AES.MODE_OCB
+    FLUSH = True
+
 
-        decrypter = AES.new(key_bytes, AES.MODE_CTR, nonce=nonce)
-        return str(decrypter.decrypt(ciphertext))
+class SIV(AeadMode):
+    """
+    Nonce misuse resistant mode, it takes a double length key (two 16 byte keys for AES-128)
+    and needs the whole message at once.
+    """
+    MODE = AES.MODE_SIV
+    KEY_SIZE = 32
+    NONCE_SIZE = 16
+    STREAMING = False
@@ -0,0 +1,186 @@
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Type, Union
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+
+from lab4.aes_modes import ECB, CBC, CFB, CTR, Mode, padding_size, to_key_bytes
+
+""" Modes with independent block ranges, by direction.
+    The Pycryptodome ciphers release the GIL, so a thread pool keeps every core busy.
+"""
+PARALLEL_ENCRYPTION = (ECB, CTR)
+PARALLEL_DECRYPTION = (ECB, CBC, CFB, CTR)
+
+
+def chunk_bounds(length: int, workers: int, chunk_size: int = None) -> list[tuple[int, int]]:
+    """
+    Split the length into block aligned chunks, a couple per worker.
+    """
+    chunk_size = chunk_size or max(-(-length // (workers * 4)), 1 << 16)
+    chunk_size += -chunk_size % AES.block_size
+
+    return [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+
+
+def chunk_cipher(mode: Type[Mode], key: bytes, iv: Optional[bytes], start: int):
+    """
+    Cipher object that continues the serial one at given offset of the data.
+    CTR starts from the counter of the chunk's first block from the nonce, CBC and CFB decryption take
+    the chunk's own iv, the ciphertext block before it (see `chunk_ivs`).
+    """
+    if mode is ECB:
+        return mode.new_cipher(key)
+
+    if mode is CTR:
+        return AES.new(key, AES.MODE_CTR, nonce=iv, initial_value=start // AES.block_size)
+
+    return mode.new_cipher(key, iv)
+
+
+def chunk_ivs(iv: bytes, data: memoryview, bounds: list[tuple[int, int]]) -> dict[int, bytes]:
+    """
+    Ivs of the CBC and CFB decryption chunks, the ciphertext block before every chunk. They are copied before any
+    chunk runs, as a decryption in place overwrites the block with plain text.
+    """
+    return {start: iv if start == 0 else bytes(data[start - AES.block_size:start]) for (start, _) in bounds}
+
+
+def run_chunks(transform: Callable[[int, int], None], bounds: list[tuple[int, int]], workers: int) -> None:
+    """
+    Call the transform for every chunk in a thread pool.
+    """
+    with ThreadPoolExecutor(workers) as pool:
+        for future in [pool.submit(transform, *chunk) for chunk in bounds]:
+            future.result()
+
+
+def encrypt_into(mode: Type[Mode], data, key: Union[str, bytes], output=None, iv: bytes = None,
+                 workers: int = None, chunk_size: int = None) -> (memoryview, Optional[bytes]):
+    """
+    Parallel counterpart of `Mode.encrypt_into` for ECB and CTR, the output is identical to the serial one.
+
+    :param mode: ECB or CTR
+    :param workers: amount of threads, the default is the cpu count
+    :param chunk_size: amount of bytes encrypted by a thread at once
+    :return: view of the ciphertext in the output buffer and the nonce (None for ECB)
+    """
+    if mode not in PARALLEL_ENCRYPTION:
+        raise ValueError(f"{mode.__name__} encryption can't be parallelized")
+
+    data = memoryview(data).cast('B')
+    size = mode.output_size(len(data))
+    output = memoryview(output if output is not None else bytearray(size)).cast('B')
+    key = to_key_bytes(key)
+    iv = (iv or get_random_bytes(8)) if mode is CTR else None
+
+    if len(output) < size:
+        raise ValueError(f"the output buffer must hold at least {size} bytes")
+
+    full = len(data) - len(data) % mode.PADDING if mode.PADDING else len(data)
+    workers = workers or os.cpu_count() or 1
+
+    def transform(start: int, end: int) -> None:
+        chunk_cipher(mode, key, iv, start).encrypt(data[start:end], output=output[start:end])
+
+    run_chunks(transform, chunk_bounds(full, workers, chunk_size), workers)
+
+    if mode.PADDING:
+        mode.encrypt_into(data[full:], key, output[full:size])
+
+    return output[:size], iv
+
+
+def decrypt_into(mode: Type[Mode], data, key: Union[str, bytes], output=None, iv: bytes = None,
+                 workers: int = None, chunk_size: int = None, unpad: bool = True) -> memoryview:
+    """
+    Parallel counterpart of `Mode.decrypt_into` for ECB, CBC, CFB and CTR, the output is identical to the serial one.
+
+    :param mode: ECB, CBC, CFB or CTR
+    :param workers: amount of threads, the default is the cpu count
+    :param chunk_size: amount of bytes decrypted by a thread at once
+    :param unpad: remove the padding of the padded modes
+    :return: view of the plain text in the output buffer
+    """
+    if mode not in PARALLEL_DECRYPTION:
+        raise ValueError(f"{mode.__name__} decryption can't be parallelized")
+
+    data = memoryview(data).cast('B')
+    output = memoryview(output if output is not None else bytearray(len(data))).cast('B')
+    key = to_key_bytes(key)
+
+    if len(output) < len(data):
+        raise ValueError(f"the output buffer must hold at least {len(data)} bytes")
+
+    workers = workers or os.cpu_count() or 1
+    bounds = chunk_bounds(len(data), workers, chunk_size)
+    ivs = chunk_ivs(iv, data, bounds) if mode in (CBC, CFB) else {}
+
+    def transform(start: int, end: int) -> None:
+        chunk_cipher(mode, key, ivs.get(start, iv), start).decrypt(data[start:end], output=output[start:end])
+
+    run_chunks(transform, bounds, workers)
+
+    if not (mode.PADDING and unpad):
+        return output[:len(data)]
+
+    return output[:len(data) - padding_size(output[:len(data)], mode.PADDING)]
+
+
+def transform_file(source: str, target: str, target_size: int,
+                   transform: Callable[[memoryview, memoryview], int]) -> None:
+    """
+    Map the source file for reading and the preallocated target for writing, the transform returns
+    the final size of the target.
+    """
+    with open(source, 'rb') as src, open(target, 'w+b') as dst:
+        dst.truncate(target_size)
+
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data, mmap.mmap(dst.fileno(), 0) as output:
+            data_view, output_view = memoryview(data), memoryview(output)
+
+            try:
+                size = transform(data_view, output_view)
+                output.flush()
+            finally:
+                data_view.release()
+                output_view.release()
+
+        dst.truncate(size)
+
+
+def encrypt_file(mode: Type[Mode], source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                 workers: int = None, chunk_size: int = None) -> Optional[bytes]:
+    """
+    Encrypt a memory mapped file with a thread pool, into a file identical to the serial `Mode.encrypt_file` one.
+
+    :return: nonce of the cipher, None for ECB
+    """
+    if os.path.getsize(source) == 0:
+        return mode.encrypt_file(source, target, key, iv)
+
+    result = []
+
+    def transform(data: memoryview, output: memoryview) -> int:
+        ciphertext, nonce = encrypt_into(mode, data, key, output, iv, workers, chunk_size)
+        result.append(nonce)
+
+        return len(ciphertext)
+
+    transform_file(source, target, mode.output_size(os.path.getsize(source)), transform)
+
+    return result[0]
+
+
+def decrypt_file(mode: Type[Mode], source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                 workers: int = None, chunk_size: int = None) -> None:
+    """
+    Decrypt a memory mapped file with a thread pool, into a file identical to the serial `Mode.decrypt_file` one.
+    """
+    if os.path.getsize(source) == 0:
+        return mode.decrypt_file(source, target, key, iv)
+
+    transform_file(source, target, os.path.getsize(source),
+                   lambda data, output: len(decrypt_into(mode, data, key, output, iv, workers, chunk_size)))
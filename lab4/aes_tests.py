@@ -1,19 +1,150 @@
 from string import ascii_uppercase as ASCII
-from typing import Any
+from typing import Any, Callable, Optional, Union
 import random
 import time
 import base64
 import argparse
+import csv
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 
-from lab4.aes_modes import ECB, CBC, OFB, CFB, CTR
-from lab4.create_files import create_files, file_name
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from lab4.aes_modes import ECB, CBC, OFB, CFB, CTR, GCM, EAX, OCB, SIV, Mode, BUFFER_SIZE, to_key_bytes
+from lab4 import aes_parallel
+from lab4.create_files import KINDS, create_files, map_file
+
+
+class CtrHmac(CTR):
+    """
+    CTR encryption followed by a separate HMAC-SHA256 pass over the nonce and the ciphertext, the two-pass
+    baseline of the authenticated modes. Meant for the benchmark only, the MAC reuses the cipher key.
+    """
+    TAG_SIZE = 32
+
+    @classmethod
+    def output_size(cls, length: int) -> int:
+        return length + cls.TAG_SIZE
+
+    @staticmethod
+    def mac(key: Union[str, bytes], nonce: bytes):
+        return hmac.new(to_key_bytes(key), nonce, hashlib.sha256)
+
+    @classmethod
+    def encrypt_into(cls, data, key: Union[str, bytes], output=None, iv: bytes = None) -> (memoryview, bytes):
+        data = memoryview(data).cast('B')
+        output = memoryview(output if output is not None else bytearray(cls.output_size(len(data)))).cast('B')
+
+        ciphertext, nonce = CTR.encrypt_into(data, key, output[:len(data)], iv)
+        mac = cls.mac(key, nonce)
+        mac.update(ciphertext)
+        output[len(data):cls.output_size(len(data))] = mac.digest()
+
+        return output[:cls.output_size(len(data))], nonce
+
+    @classmethod
+    def decrypt_into(cls, data, key: Union[str, bytes], output=None, iv: bytes = None) -> memoryview:
+        data = memoryview(data).cast('B')
+
+        if len(data) < cls.TAG_SIZE:
+            raise ValueError("MAC check failed")
+
+        ciphertext, tag = data[:len(data) - cls.TAG_SIZE], data[len(data) - cls.TAG_SIZE:]
+        mac = cls.mac(key, iv)
+        mac.update(ciphertext)
+
+        if not hmac.compare_digest(mac.digest(), tag):
+            raise ValueError("MAC check failed")
+
+        return CTR.decrypt_into(ciphertext, key, output, iv)
+
+    @classmethod
+    def encrypt_file(cls, source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                     buffer_size: int = BUFFER_SIZE) -> bytes:
+        nonce = CTR.encrypt_file(source, target, key, iv, buffer_size)
+        mac = cls.mac(key, nonce)
+
+        with open(target, 'r+b') as f:
+            while chunk := f.read(buffer_size):
+                mac.update(chunk)
+
+            f.write(mac.digest())
+
+        return nonce
+
+    @classmethod
+    def decrypt_file(cls, source: str, target: str, key: Union[str, bytes], iv: bytes = None,
+                     buffer_size: int = BUFFER_SIZE) -> None:
+        remaining = os.path.getsize(source) - cls.TAG_SIZE
+        mac = cls.mac(key, iv)
+
+        if remaining < 0:
+            raise ValueError("MAC check failed")
+
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(min(buffer_size, remaining - f.tell())), b''):
+                mac.update(chunk)
+
+            if not hmac.compare_digest(mac.digest(), f.read()):
+                raise ValueError("MAC check failed")
+
+        decryptor = CTR.decryptor(key, iv)
+
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            while remaining and (chunk := src.read(min(buffer_size, remaining))):
+                dst.write(decryptor.update(chunk))
+                remaining -= len(chunk)
+
+
+MODES = {'ECB': ECB, 'CBC': CBC, 'OFB': OFB, 'CFB': CFB, 'CTR': CTR,
+         'GCM': GCM, 'EAX': EAX, 'OCB': OCB, 'SIV': SIV, 'CTR+HMAC': CtrHmac}
+DIRECTIONS = ('encrypt', 'decrypt')
+ENGINES = ('memory', 'stream', 'parallel')
+FIELDS = ('engine', 'mode', 'direction', 'kind', 'size_mb', 'bytes', 'repeat', 'median_ms', 'p95_ms', 'stdev_ms',
+          'mean_ms', 'mb_s', 'tracemalloc_peak_mb', 'peak_per_mb', 'rss_peak_mb', 'rss_growth_mb')
 
 
 def parse_args() -> dict[str, Any]:
     parser = argparse.ArgumentParser(description="Run AES mode performance tests.")
     parser.add_argument('--fsize', metavar='File sizes', type=int, nargs='+',
                         help='sizes of the files used in tests [MB]', required=False)
+    parser.add_argument('--kind', choices=KINDS, default='text', help='content of the test files', required=False)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the test file generator', required=False)
+    parser.add_argument('--modes', nargs='+', choices=MODES.keys(), default=list(MODES.keys()),
+                        help='modes to benchmark, CTR+HMAC is the two-pass baseline of the authenticated modes',
+                        required=False)
+    parser.add_argument('--directions', nargs='+', choices=DIRECTIONS, default=list(DIRECTIONS),
+                        help='directions to benchmark', required=False)
+    parser.add_argument('--engine', nargs='+', choices=ENGINES, default=['memory'],
+                        help='in-memory buffers, constant memory file-to-file streams '
+                             + 'or the parallel engine over memory mapped files', required=False)
+    parser.add_argument('--repeat', type=int, default=5, help='measured runs of every case', required=False)
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs before every case', required=False)
+    parser.add_argument('--memory', action='store_true',
+                        help='profile the memory of every case in a fresh process, next to the timings',
+                        required=False)
+    parser.add_argument('--output', help='save the results to a .json or .csv file', required=False)
+    parser.add_argument('--compare', metavar='Baseline', help='.json or .csv results of a previous run',
+                        required=False)
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative median slowdown reported as a regression', required=False)
     parser.add_argument('--runc', action='store_true', help='run the byte corruption tests', required=False)
+    parser.add_argument('--workers', type=int, help='amount of threads of the parallel engine', required=False)
+    parser.add_argument('--batch', metavar='Message count', type=int,
+                        help='run the small message batch test with given amount of messages', required=False)
+    parser.add_argument('--msize', metavar='Message size', type=int, default=1024,
+                        help='maximal size of the batch test messages [B]', required=False)
 
     return vars(parser.parse_args())
 
@@ -26,134 +157,317 @@ def duration_ms(start: int) -> int:
     return current_ms() - start
 
 
-def ecb_test(text: str, key: str) -> (int, int, int):
-    start = current_ms()
-    ciphertext = ECB.encrypt(text, key)
-    encrypt_duration = duration_ms(start)
+def measure(function: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> (list[int], Any):
+    """
+    Time the function with the monotonic high resolution clock.
 
-    start = current_ms()
-    result = ECB.decrypt(ciphertext, key)
-    decrypt_duration = duration_ms(start)
+    :param function: the measured call without arguments
+    :param repeat: amount of measured runs
+    :param warmup: amount of runs before the measured ones, they fill the caches and the lazy imports
+    :return: durations of the measured runs in nanoseconds and the result of the last run
+    """
+    for _ in range(warmup):
+        function()
 
-    total = encrypt_duration + decrypt_duration
+    samples = []
 
-    print(f"e={encrypt_duration}, d={decrypt_duration}\t"
-          + f"total = {encrypt_duration + decrypt_duration} [ms]")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        result = function()
+        samples.append(time.perf_counter_ns() - start)
 
-    return encrypt_duration, decrypt_duration, total
+    return samples, result
 
 
-def cbc_test(text: str, key: str) -> (int, int, int):
-    start = current_ms()
-    ciphertext, iv = CBC.encrypt(text, key)
-    encrypt_duration = duration_ms(start)
+def summarize(samples: list[int], size: int) -> dict[str, float]:
+    """
+    Statistics of the durations in milliseconds and the throughput of the median run.
 
-    start = current_ms()
-    result = CBC.decrypt(ciphertext, iv, key)
-    decrypt_duration = duration_ms(start)
+    :param samples: durations in nanoseconds
+    :param size: amount of bytes processed by one run
+    """
+    ms = np.array(samples) / 1e6
+    median = float(np.median(ms))
 
-    total = encrypt_duration + decrypt_duration
+    return {'repeat': len(samples),
+            'median_ms': round(median, 3),
+            'p95_ms': round(float(np.percentile(ms, 95)), 3),
+            'stdev_ms': round(float(ms.std(ddof=1)) if len(ms) > 1 else 0.0, 3),
+            'mean_ms': round(float(ms.mean()), 3),
+            'mb_s': round(size / 1e6 / (median / 1000), 1) if median else float('inf')}
 
-    print(f"e={encrypt_duration}, d={decrypt_duration}\t"
-          + f"total = {total} [ms]")
 
-    return encrypt_duration, decrypt_duration, total
+def max_rss() -> Optional[int]:
+    """
+    High-water mark of the resident set size of the process in bytes, None where unavailable.
+    Linux keeps `ru_maxrss` across fork and exec, so the per-process VmHWM is preferred there.
+    """
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
 
+    if resource is None:
+        return None
 
-def ofb_test(text: str, key: str) -> (int, int, int):
-    start = current_ms()
-    ciphertext, iv = OFB.encrypt(text, key)
-    encrypt_duration = duration_ms(start)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
 
-    start = current_ms()
-    result = OFB.decrypt(ciphertext, iv, key)
-    decrypt_duration = duration_ms(start)
 
-    total = encrypt_duration + decrypt_duration
+def profile_memory(engine: str, name: str, direction: str, source: str, key: str,
+                   workers: int = None) -> dict[str, Optional[float]]:
+    """
+    Memory used by one call of a case, meant to run in a fresh process, as the RSS high-water mark only grows.
+    The RSS is taken from a plain call and the Python allocations from a second call under tracemalloc,
+    so the tracing overhead doesn't show in the RSS. Unlike the timed calls, the in-memory cases allocate
+    their output buffer within the call, so it is part of both.
 
-    print(f"e={encrypt_duration}, d={decrypt_duration}\t"
-          + f"total = {total} [ms]")
+    The tracemalloc peak is the largest amount of memory allocated by Python at once during the call, not the sum
+    of all its allocations, buffers freed before the peak don't count.
 
-    return encrypt_duration, decrypt_duration, total
+    :return: tracemalloc peak, the peak per processed megabyte, the RSS high-water mark and its growth by the call
+    """
+    function, _ = prepare_case(engine, MODES[name], direction, source, key, workers, preallocate=False)
+    size = os.path.getsize(source) / 1e6
 
+    before = max_rss()
+    function()
+    after = max_rss()
 
-def cfb_test(text: str, key: str) -> (int, int, int):
-    start = current_ms()
-    ciphertext, iv = CFB.encrypt(text, key)
-    encrypt_duration = duration_ms(start)
+    tracemalloc.start()
+    traced = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - traced
+    tracemalloc.stop()
+
+    return {'tracemalloc_peak_mb': round(peak / 1e6, 3),
+            'peak_per_mb': round(peak / size) if size else None,
+            'rss_peak_mb': round(after / 1e6, 3) if after is not None else None,
+            'rss_growth_mb': round((after - before) / 1e6, 3) if after is not None else None}
 
-    start = current_ms()
-    result = CFB.decrypt(ciphertext, iv, key)
-    decrypt_duration = duration_ms(start)
 
-    total = encrypt_duration + decrypt_duration
+def isolated_profile(*case) -> dict[str, Optional[float]]:
+    """
+    Run `profile_memory` of the case in a newly spawned process.
+    """
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(profile_memory, *case).result()
 
-    print(f"e={encrypt_duration}, d={decrypt_duration}\t"
-          + f"total = {total} [ms]")
 
-    return encrypt_duration, decrypt_duration, total
+def supported(engine: str, mode: type[Mode], direction: str) -> bool:
+    if engine != 'parallel':
+        return True
 
+    return mode in (aes_parallel.PARALLEL_ENCRYPTION if direction == 'encrypt' else aes_parallel.PARALLEL_DECRYPTION)
 
-def ctr_test(text: str, key: str) -> (int, int, int):
-    start = current_ms()
-    ciphertext, nonce = CTR.encrypt(text, key)
-    encrypt_duration = duration_ms(start)
 
-    start = current_ms()
-    result = CTR.decrypt(ciphertext, nonce, key)
-    decrypt_duration = duration_ms(start)
+def prepare_case(engine: str, mode: type[Mode], direction: str, source: str, key: str, workers: int = None,
+                 plain=None, preallocate: bool = True) -> (Callable[[], Any], Callable[[Any], bool]):
+    """
+    Build the measured call of a case and the check of its result, the decryption cases encrypt the source
+    beforehand. The in-memory calls write into preallocated buffers, so allocation isn't measured.
 
-    total = encrypt_duration + decrypt_duration
+    :param plain: memory mapped view of the source for the in-memory cases, mapped when not given
+    :param preallocate: allocate the output of the in-memory cases up front, otherwise every call allocates it
+    :return: the measured call and the check of the value returned by it
+    """
+    size = os.path.getsize(source)
+    key = key[:mode.KEY_SIZE]
 
-    print(f"e={encrypt_duration}, d={decrypt_duration}\t"
-          + f"total = {total} [ms]")
+    if engine == 'memory':
+        plain = map_file(source) if plain is None else plain
+        ciphertext, iv = mode.encrypt_into(plain, key)
+        ciphertext = bytes(ciphertext)
 
-    return encrypt_duration, decrypt_duration, total
+        if direction == 'encrypt':
+            output = bytearray(mode.output_size(size)) if preallocate else None
+            return (lambda: mode.encrypt_into(plain, key, output, iv),
+                    lambda result: bytes(result[0]) == ciphertext)
 
-def get_averages(results: list[tuple[int, int, int]]) -> (int, int, int):
-    sum_enc = 0
-    sum_dec = 0
-    sum_tot = 0
+        output = bytearray(len(ciphertext)) if preallocate else None
+        return lambda: mode.decrypt_into(ciphertext, key, output, iv), lambda result: result == memoryview(plain)
 
-    for (e, d, t) in results:
-        sum_enc += e
-        sum_dec += d
-        sum_tot += t
+    encrypted, decrypted = f'{source}.enc', f'{source}.dec'
+    iv = mode.encrypt_file(source, encrypted, key)
 
-    return sum_enc / len(results), sum_dec / len(results), sum_tot / len(results)
+    if engine == 'stream':
+        if direction == 'encrypt':
+            return lambda: mode.encrypt_file(source, decrypted, key, iv), lambda _: same_files(encrypted, decrypted)
 
-def file_test(sizes: list[int]) -> None:
-    create_files(sizes)
-    rounds = 5
+        return lambda: mode.decrypt_file(encrypted, decrypted, key, iv), lambda _: same_files(source, decrypted)
 
-    key = ''.join([random.choice(ASCII) for _ in range(16)])
+    if direction == 'encrypt':
+        return (lambda: aes_parallel.encrypt_file(mode, source, decrypted, key, iv, workers),
+                lambda _: same_files(encrypted, decrypted))
+
+    return (lambda: aes_parallel.decrypt_file(mode, encrypted, decrypted, key, iv, workers),
+            lambda _: same_files(source, decrypted))
+
+
+def same_files(first: str, second: str) -> bool:
+    with open(first, 'rb') as f, open(second, 'rb') as s:
+        while (chunk := f.read(1 << 20)) == s.read(1 << 20):
+            if not chunk:
+                return True
+
+    return False
+
+
+def run_benchmark(sizes: list[int], modes: list[str], directions: list[str], engines: list[str], repeat: int = 5,
+                  warmup: int = 1, workers: int = None, kind: str = 'text', seed: int = 0,
+                  memory: bool = False) -> list[dict[str, Any]]:
+    """
+    Measure every combination of the engines, file sizes, modes and directions.
+    The test files are generated once per kind and seed, the in-memory cases read them through a memory map.
+    With memory profiling every case is run once more in a fresh process, see `profile_memory`.
+
+    :raises AssertionError: When the result of a case is wrong.
+    :return: a row of statistics per case
+    """
+    sources = create_files(sizes, kind, seed)
+
+    key = ''.join([random.choice(ASCII) for _ in range(32)])
     print(f'KEY = {key}')
 
-    for size in sizes:
-        with open(file_name(size), 'r') as f:
-            text = ''.join(f.readlines())
+    results = []
 
-            print(f"\nTesting with a file of {size}MB...")
+    for size, source in zip(sizes, sources):
+        print(f"\nTesting with a {kind} file of {size}MB...")
+        plain = map_file(source)
 
-            print(f"ECB...")
-            e, d, t = get_averages([ecb_test(text, key) for _ in range(rounds)])
-            print(f"avg enc = {e}\t avg dec = {d}\t avg tot = {t}\n")
+        for engine in engines:
+            for name, mode in [(name, MODES[name]) for name in modes]:
+                for direction in [d for d in directions if supported(engine, mode, d)]:
+                    function, check = prepare_case(engine, mode, direction, source, key, workers, plain)
+                    samples, result = measure(function, repeat, warmup)
 
-            print(f"CBC...")
-            e, d, t = get_averages([cbc_test(text, key) for _ in range(rounds)])
-            print(f"avg enc = {e}\t avg dec = {d}\t avg tot = {t}\n")
+                    assert check(result), f"{engine} {name} {direction} gave a wrong result"
 
-            print(f"OFB...")
-            e, d, t = get_averages([ofb_test(text, key) for _ in range(rounds)])
-            print(f"avg enc = {e}\t avg dec = {d}\t avg tot = {t}\n")
+                    row = {'engine': engine, 'mode': name, 'direction': direction, 'kind': kind,
+                           'size_mb': size, 'bytes': os.path.getsize(source),
+                           **summarize(samples, os.path.getsize(source))}
 
-            print(f"CFB...")
-            e, d, t = get_averages([cfb_test(text, key) for _ in range(rounds)])
-            print(f"avg enc = {e}\t avg dec = {d}\t avg tot = {t}\n")
+                    if memory:
+                        row.update(isolated_profile(engine, name, direction, source, key, workers))
 
-            print(f"CTR...")
-            e, d, t = get_averages([ctr_test(text, key) for _ in range(rounds)])
-            print(f"avg enc = {e}\t avg dec = {d}\t avg tot = {t}\n")
+                    results.append(row)
+
+                    print(f"{engine} {name} {direction}...\tmedian={row['median_ms']}, "
+                          + f"p95={row['p95_ms']}, stdev={row['stdev_ms']} [ms]\t{row['mb_s']} [MB/s]"
+                          + (f"\ttracemalloc={row['tracemalloc_peak_mb']} [MB] ({row['peak_per_mb']} [B/MB]), "
+                             + f"rss={row['rss_peak_mb']} (+{row['rss_growth_mb']}) [MB]" if memory else ''))
+
+            for path in (f'{source}.enc', f'{source}.dec'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if hasattr(plain, 'close'):
+            plain.close()
+
+    return results
+
+
+def authenticated_gain(results: list[dict[str, Any]], baseline: str = 'CTR+HMAC') -> None:
+    """
+    Print how much faster every authenticated mode is than the two-pass baseline in the same case.
+    """
+    case = lambda row: (row['engine'], row['direction'], row['kind'], row['size_mb'])
+    reference = {case(row): row['median_ms'] for row in results if row['mode'] == baseline}
+    rows = [row for row in results if row['mode'] in ('GCM', 'EAX', 'OCB', 'SIV') and case(row) in reference]
+
+    if rows:
+        print(f"\nSingle pass authenticated modes against {baseline}...")
+
+    for row in rows:
+        print(f"{row['engine']} {row['mode']} {row['direction']} {row['size_mb']}MB...\t"
+              + f"{reference[case(row)] / row['median_ms']:.2f}x")
+
+
+def save_results(results: list[dict[str, Any]], path: str) -> None:
+    """
+    Save the results as JSON or CSV, chosen by the extension of the path.
+    """
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> list[dict[str, Any]]:
+    with open(path, newline='') as f:
+        if not path.endswith('.csv'):
+            return json.load(f)
+
+        return [{key: value if key in ('engine', 'mode', 'direction', 'kind') else
+                 int(value) if key in ('size_mb', 'bytes', 'repeat') else float(value) if value else None
+                 for (key, value) in row.items()} for row in csv.DictReader(f)]
+
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]], threshold: float = 0.1) -> int:
+    """
+    Compare the medians, and the tracemalloc peaks when both runs profiled the memory, of the cases present
+    in both runs.
+
+    :param threshold: relative slowdown of the median or growth of the peak reported as a regression
+    :return: amount of regressions
+    """
+    case = lambda row: (row['engine'], row['mode'], row['direction'], row.get('kind', 'text'), row['size_mb'])
+    previous = {case(row): row for row in baseline}
+    regressions = 0
+
+    print(f"\nComparison with the baseline (threshold {threshold:.0%})...")
+
+    for row in results:
+        if (old := previous.get(case(row))) is None:
+            continue
+
+        change = row['median_ms'] / old['median_ms'] - 1 if old['median_ms'] else 0.0
+        memory = row.get('tracemalloc_peak_mb') is not None and old.get('tracemalloc_peak_mb') is not None
+        growth = row['tracemalloc_peak_mb'] / old['tracemalloc_peak_mb'] - 1 \
+            if memory and old['tracemalloc_peak_mb'] else 0.0
+        regression = change > threshold or growth > threshold
+        regressions += regression
+
+        print(f"{' '.join(map(str, case(row)))}MB...\t{old['median_ms']} -> {row['median_ms']} [ms]\t"
+              + f"{change:+.1%}"
+              + (f"\t{old['tracemalloc_peak_mb']} -> {row['tracemalloc_peak_mb']} [MB]\t{growth:+.1%}"
+                 if memory else '')
+              + ("\tREGRESSION" if regression else ''))
+
+    print(f"{regressions} regressions")
+
+    return regressions
+
+
+def batch_test(count: int, max_size: int = 1024, repeat: int = 5, warmup: int = 1) -> None:
+    """
+    Messages per second of the batch API against a loop of single `encrypt_into`/`decrypt_into` calls,
+    the batch results are checked against the single ones.
+    """
+    messages = [random.randbytes(random.randint(1, max_size)) for _ in range(count)]
+
+    print(f'\nTesting with {count} messages of up to {max_size}B...')
+
+    for name, mode in MODES.items():
+        if mode is CtrHmac:
+            continue
+
+        key = ''.join([random.choice(ASCII) for _ in range(mode.KEY_SIZE)])
+        single_encryption, single = measure(lambda: [mode.encrypt_into(m, key) for m in messages], repeat, warmup)
+        single_decryption, _ = measure(lambda: [mode.decrypt_into(c, key, iv=iv) for (c, iv) in single],
+                                       repeat, warmup)
+        batch_encryption, batch = measure(lambda: mode.encrypt_batch(messages, key), repeat, warmup)
+        batch_decryption, plain = measure(lambda: mode.decrypt_batch(batch, key), repeat, warmup)
+
+        assert bytes(batch[0]) == bytes(mode.encrypt_into(messages[0], key, iv=batch.iv(0))[0])
+        assert bytes(plain.buffer) == b''.join(messages), f"{name} batch decryption differs"
+
+        rate = lambda samples: f"{count * 1e9 / np.median(samples):.0f}"
+        print(f"{name}...\tsingle e={rate(single_encryption)}, d={rate(single_decryption)}\t"
+              + f"batch e={rate(batch_encryption)}, d={rate(batch_decryption)} [messages/s]")
 
 
 def corrupt(b: bytes, position: int = 0) -> bytes:
@@ -222,9 +536,25 @@ def error_test() -> None:
 
 if __name__ == '__main__':
     args = parse_args()
+    regressions = 0
 
     if sizes := args['fsize']:
-        file_test(sizes)
+        results = run_benchmark(sizes, args['modes'], args['directions'], args['engine'], args['repeat'],
+                                args['warmup'], args['workers'], args['kind'], args['seed'], args['memory'])
+
+        authenticated_gain(results)
+
+        if args['output']:
+            save_results(results, args['output'])
+
+        if args['compare']:
+            regressions = compare(results, load_results(args['compare']), args['threshold'])
+
+    if count := args['batch']:
+        batch_test(count, args['msize'], args['repeat'], args['warmup'])
 
     if args['runc']:
         error_test()
+
+    if regressions:
+        sys.exit(1)
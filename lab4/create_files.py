@@ -1,53 +1,161 @@
+import argparse
+import hashlib
+import json
+import mmap
 import os
+from typing import Any, Iterator
+
+import numpy as np
 
 TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt mollit anim id est laborum.\n"
 BYTES = len(TEXT)
 
+""" text - lorem ipsum words in a seeded order, binary - random bytes with a skewed (compressible) distribution,
+    incompressible - uniformly random bytes
+"""
+KINDS = ('text', 'binary', 'incompressible')
+BLOCK_SIZE = 1 << 22
+LINE_POOL = 1024
+MANIFEST = 'corpus.json'
+
 
 def mb(length: int) -> int: return length * 1000000
 
 
-def file_name(size: int) -> str: return f"{size}mb.txt"
+def file_name(size: int, kind: str = 'text') -> str:
+    return f"{size}mb.txt" if kind == 'text' else f"{size}mb.{kind}.bin"
+
+
+def corpus_blocks(length: int, kind: str = 'text', seed: int = 0, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Deterministic corpus content, the same kind, seed and length always give the same bytes.
+
+    :param length: amount of bytes
+    :param kind: one of KINDS
+    :param seed: seed of the generator
+    :param block_size: size of the yielded blocks, the last one may be shorter
+    """
+    rng = np.random.default_rng(seed)
+    words = TEXT.split()
+    lines = np.array([(' '.join(rng.permutation(words)) + '\n').encode('utf8') for _ in range(LINE_POOL)])
+
+    for start in range(0, length, block_size):
+        size = min(block_size, length - start)
+
+        if kind == 'text':
+            yield b''.join(lines[rng.integers(0, LINE_POOL, size // BYTES + 1)])[:size]
+        elif kind == 'binary':
+            yield np.minimum(rng.exponential(24, size), 255).astype(np.uint8).tobytes()
+        elif kind == 'incompressible':
+            yield rng.bytes(size)
+        else:
+            raise ValueError(f"unknown corpus kind '{kind}', use one of {KINDS}")
 
 
-def create_file(size: int) -> None:
-    filename = file_name(size)
+def create_file(size: int, kind: str = 'text', seed: int = 0, directory: str = '.') -> str:
+    """
+    Write a corpus file in large blocks.
 
-    print(f'Creating {size}MB file as "{filename}"...')
+    :param size: size of the file in megabytes
+    :return: sha256 checksum of the written file
+    """
+    filename = file_name(size, kind)
+    checksum = hashlib.sha256()
+    target = mb(size)
 
-    with open(filename, 'w') as f:
-        file_size = 0
-        target = mb(size)
+    print(f'Creating {size}MB {kind} file as "{filename}"...')
 
-        while file_size < target:
-            f.write(TEXT)
-            file_size += BYTES
+    with open(os.path.join(directory, filename), 'wb') as f:
+        for block in corpus_blocks(target, kind, seed):
+            f.write(block)
+            checksum.update(block)
 
-            print(f'\r{file_size}/{target}', end='')
+            print(f'\r{f.tell()}/{target}', end='')
 
     print(f' Done {size}MB file')
 
+    return checksum.hexdigest()
+
+
+def file_checksum(path: str) -> str:
+    checksum = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        while block := f.read(BLOCK_SIZE):
+            checksum.update(block)
+
+    return checksum.hexdigest()
+
 
-def create_files(sizes: list[int]) -> None:
+def load_manifest(directory: str = '.') -> dict[str, Any]:
+    path = os.path.join(directory, MANIFEST)
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict[str, Any], directory: str = '.') -> None:
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def create_files(sizes: list[int], kind: str = 'text', seed: int = 0, directory: str = '.',
+                 verify: bool = False) -> list[str]:
     """
-    Create random text files with given size
+    Create the corpus files with given sizes, existing files are kept when they match the manifest
+    (size, kind and seed, and the checksum when verified) and regenerated otherwise.
     :param sizes: list of file sizes in megabytes
+    :param kind: one of KINDS
+    :param seed: seed of the generator
+    :param directory: directory of the files and of the manifest
+    :param verify: recompute the checksums of the existing files
+    :return: paths of the files
     """
-    files = [(file_name(i), i) for i in sizes]
-    generate = []
+    manifest = load_manifest(directory)
 
-    for (f, size) in files:
-        if f in os.listdir():
-            print(
-                f"A file with name used in generation already exists in execution folder ('{f}'), delete it and create new one? [y/n]")
+    for size in sizes:
+        filename = file_name(size, kind)
+        path = os.path.join(directory, filename)
+        expected = {'size': mb(size), 'kind': kind, 'seed': seed}
+        entry = manifest.get(filename, {})
 
-            if str(input()) in ('y', 'Y'):
-                os.remove(f"./{f}")
-                generate.append(size)
+        if os.path.exists(path) and os.path.getsize(path) == mb(size) \
+                and {key: entry.get(key) for key in expected} == expected \
+                and (not verify or file_checksum(path) == entry.get('sha256')):
+            continue
 
-    for i in generate:
-        create_file(i)
+        manifest[filename] = {**expected, 'sha256': create_file(size, kind, seed, directory)}
+        save_manifest(manifest, directory)
+
+    return [os.path.join(directory, file_name(size, kind)) for size in sizes]
+
+
+def map_file(path: str) -> mmap.mmap:
+    """
+    Read-only memory mapped view of a corpus file, it can be passed to the AES modes as any other buffer.
+    Empty files can't be mapped, they give an empty bytes object.
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+
+
+def parse_args() -> dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Create deterministic files for the AES mode performance tests.")
+    parser.add_argument('--fsize', metavar='File sizes', type=int, nargs='+', default=[1, 200, 500],
+                        help='sizes of the files [MB]', required=False)
+    parser.add_argument('--kind', choices=KINDS, default='text', help='content of the files', required=False)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generator', required=False)
+    parser.add_argument('--dir', default='.', help='directory of the files', required=False)
+    parser.add_argument('--verify', action='store_true', help='verify the checksums of the existing files',
+                        required=False)
+
+    return vars(parser.parse_args())
 
 
 if __name__ == '__main__':
-    create_files([1, 200, 500])
+    args = parse_args()
+
+    create_files(args['fsize'], args['kind'], args['seed'], args['dir'], args['verify'])
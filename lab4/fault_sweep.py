@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+from Cryptodome.Cipher import AES
+
+from lab4.aes_modes import ECB, CBC, OFB, CFB, CTR, GCM, EAX, OCB, SIV, AeadMode, Mode
+
+MODES = {'ECB': ECB, 'CBC': CBC, 'OFB': OFB, 'CFB': CFB, 'CTR': CTR, 'GCM': GCM, 'EAX': EAX, 'OCB': OCB, 'SIV': SIV}
+""" A decrypted byte of ECB, CBC, OFB, CFB and CTR depends on at most the ciphertext block it's in and the one before,
+    so a window of the flipped block and two more holds every change. Changes reaching the last block of the window
+    are counted as `beyond_window`, a larger window shows how far they go.
+"""
+WINDOW_BLOCKS = 3
+CHUNK_BITS = 1 << 15
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(1)
+
+
+def flip_positions(length: int, samples: int = None, seed: int = 0) -> np.ndarray:
+    """
+    Bit positions to flip in a ciphertext of given length, every bit or a sorted random sample.
+    """
+    if samples is None or samples >= length * 8:
+        return np.arange(length * 8)
+
+    return np.sort(np.random.default_rng(seed).choice(length * 8, samples, replace=False))
+
+
+def windows(data: np.ndarray, starts: np.ndarray, width: int) -> np.ndarray:
+    """
+    Rows of `width` bytes of the data from every start, the part past the end of the data is zero.
+    """
+    padded = np.concatenate((data, np.zeros(width, np.uint8)))
+
+    return padded[starts[:, None] + np.arange(width)]
+
+
+def decrypt_windows(mode: type[Mode], cipher, ciphertext: np.ndarray, context: np.ndarray,
+                    keystream: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Decrypt many block aligned ciphertext windows at once.
+
+    :param cipher: ECB cipher object with the key
+    :param ciphertext: a window per row
+    :param context: the ciphertext block before every window (the iv for the first one), used by CBC and CFB
+    :param keystream: the key stream under every window, used by OFB and CTR as it doesn't depend on the ciphertext
+    :return: plain text windows
+    """
+    if mode in (OFB, CTR):
+        return ciphertext ^ keystream
+
+    if mode is ECB:
+        return np.frombuffer(cipher.decrypt(ciphertext.tobytes()), np.uint8).reshape(ciphertext.shape)
+
+    if mode is CBC:
+        plain = np.frombuffer(cipher.decrypt(ciphertext.tobytes()), np.uint8).reshape(ciphertext.shape)
+
+        return plain ^ np.concatenate((context, ciphertext[:, :-AES.block_size]), axis=1)
+
+    registers = np.lib.stride_tricks.sliding_window_view(np.concatenate((context, ciphertext), axis=1),
+                                                         AES.block_size, axis=1)[:, :ciphertext.shape[1]]
+    encrypted = np.frombuffer(cipher.encrypt(np.ascontiguousarray(registers).tobytes()), np.uint8)
+
+    return encrypted.reshape(registers.shape)[:, :, 0] ^ ciphertext
+
+
+def sweep_chunk(name: str, key: bytes, iv: Optional[bytes], ciphertext: bytes, plain: bytes, positions: np.ndarray,
+                window_blocks: int = WINDOW_BLOCKS) -> dict[str, Any]:
+    """
+    Flip every given bit of the ciphertext one at a time and compare the decrypted windows with the original ones.
+
+    :param name: name of the mode in MODES
+    :param plain: raw (padded) decryption of the ciphertext
+    :param positions: bit positions, the most significant bit of a byte first
+    :return: histograms and counts that can be merged by `merge`
+    """
+    mode = MODES[name]
+    width = window_blocks * AES.block_size
+    cipher = AES.new(key, AES.MODE_ECB)
+    data = np.frombuffer(ciphertext, np.uint8)
+    keystream = data ^ np.frombuffer(plain, np.uint8) if mode in (OFB, CTR) else None
+    chained = np.concatenate((np.frombuffer(iv or bytes(AES.block_size), np.uint8)[:AES.block_size], data))
+
+    byte, mask = positions // 8, (0x80 >> (positions % 8)).astype(np.uint8)
+    starts, rows = np.unique(byte - byte % AES.block_size, return_inverse=True)
+
+    decrypt = lambda windows_, starts_: decrypt_windows(
+        mode, cipher, windows_, windows(chained, starts_, AES.block_size),
+        windows(keystream, starts_, width) if keystream is not None else None)
+
+    original = decrypt(windows(data, starts, width), starts)[rows]
+    corrupted = windows(data, starts[rows], width)
+    corrupted[np.arange(len(byte)), byte - starts[rows]] ^= mask
+
+    diff = decrypt(corrupted, starts[rows]) ^ original
+    diff *= (starts[rows, None] + np.arange(width)) < len(data)
+    changed = diff != 0
+    relative = (starts[rows] - byte + AES.block_size - 1)[:, None] + np.arange(width)
+
+    return {'flips': len(byte),
+            'bytes': np.bincount(changed.sum(1), minlength=width + 1),
+            'bits': np.bincount(POPCOUNT[diff].sum(1), minlength=8 * width + 1),
+            'offsets': np.bincount(relative[changed], minlength=width + AES.block_size - 1),
+            'blocks': changed.reshape(len(byte), window_blocks, AES.block_size).any(2).sum(0),
+            'same_bit': int((diff[np.arange(len(byte)), byte - starts[rows]] == mask).sum()),
+            'beyond_window': int((changed[:, -AES.block_size:].any(1) & (starts[rows] + width < len(data))).sum())}
+
+
+def authenticated_chunk(name: str, key: bytes, iv: bytes, ciphertext: bytes, positions: np.ndarray) -> dict[str, Any]:
+    """
+    Flip the given bits of an authenticated ciphertext one at a time, every flip needs a decryption of
+    the whole message.
+    """
+    mode = MODES[name]
+    data = bytearray(ciphertext)
+    output = bytearray(len(data))
+    rejected = 0
+
+    for position in positions.tolist():
+        data[position // 8] ^= 0x80 >> (position % 8)
+
+        try:
+            mode.decrypt_into(data, key, output, iv)
+        except ValueError:
+            rejected += 1
+
+        data[position // 8] ^= 0x80 >> (position % 8)
+
+    return {'flips': len(positions), 'rejected': rejected}
+
+
+def merge(first: dict[str, Any], second: dict[str, Any]) -> dict[str, Any]:
+    return {key: first[key] + second[key] for key in first}
+
+
+def summarize(name: str, counts: dict[str, Any], length: int) -> dict[str, Any]:
+    """
+    Reduce the merged histograms to the propagation pattern of the mode.
+    """
+    flips = counts['flips']
+    summary = {'mode': name, 'ciphertext_bytes': length, 'flips': flips}
+
+    if 'rejected' in counts:
+        return {**summary, 'rejected': counts['rejected'] / flips if flips else 0.0}
+
+    bytes_changed, bits_changed = counts['bytes'], counts['bits']
+    affected = np.flatnonzero(counts['offsets']) - (AES.block_size - 1)
+
+    return {**summary,
+            'bytes_changed': {'mean': float(bytes_changed @ np.arange(len(bytes_changed)) / flips),
+                              'min': int(np.flatnonzero(bytes_changed)[0]),
+                              'max': int(np.flatnonzero(bytes_changed)[-1])},
+            'bits_changed_mean': float(bits_changed @ np.arange(len(bits_changed)) / flips),
+            'affected_offsets': [int(affected[0]), int(affected[-1])] if len(affected) else [],
+            'blocks_changed': {f'+{i}': float(count / flips) for (i, count) in enumerate(counts['blocks'])},
+            'same_bit': counts['same_bit'] / flips,
+            'beyond_window': counts['beyond_window']}
+
+
+def sweep(name: str, data: bytes, key: bytes, samples: int = None, seed: int = 0, workers: int = None,
+          chunk_bits: int = CHUNK_BITS, window_blocks: int = WINDOW_BLOCKS) -> dict[str, Any]:
+    """
+    Encrypt the data with the mode and sweep bit flips over the whole ciphertext in a process pool.
+
+    :param name: name of the mode in MODES
+    :param samples: amount of randomly chosen bits, every bit when not given
+    :param workers: amount of processes, the default is the cpu count
+    :return: summary of the error propagation
+    """
+    mode = MODES[name]
+    ciphertext, iv = mode.encrypt_into(data, key)
+    ciphertext = bytes(ciphertext)
+    positions = flip_positions(len(ciphertext), samples, seed)
+    chunks = [positions[i:i + chunk_bits] for i in range(0, len(positions), chunk_bits)]
+
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        if issubclass(mode, AeadMode):
+            futures = [pool.submit(authenticated_chunk, name, key, iv, ciphertext, chunk) for chunk in chunks]
+        else:
+            plain = bytes(mode.decrypt_into(ciphertext, key, iv=iv, unpad=False))
+            futures = [pool.submit(sweep_chunk, name, key, iv, ciphertext, plain, chunk, window_blocks)
+                       for chunk in chunks]
+
+        counts = futures[0].result()
+
+        for future in futures[1:]:
+            counts = merge(counts, future.result())
+
+    return summarize(name, counts, len(ciphertext))
+
+
+def print_summary(summary: dict[str, Any]) -> None:
+    print(f"{summary['mode']}...\tflips = {summary['flips']} over {summary['ciphertext_bytes']}B")
+
+    if 'rejected' in summary:
+        print(f"\trejected = {summary['rejected']:.2%}")
+        return
+
+    changed = summary['bytes_changed']
+    blocks = ', '.join(f"{block} = {share:.0%}" for (block, share) in summary['blocks_changed'].items())
+
+    print(f"\tbytes changed mean = {changed['mean']:.2f} (min {changed['min']}, max {changed['max']}), "
+          + f"bits changed mean = {summary['bits_changed_mean']:.2f}")
+    print(f"\taffected offsets = {summary['affected_offsets']}, blocks changed: {blocks}")
+    print(f"\tonly the flipped bit kept = {summary['same_bit']:.2%}, beyond window = {summary['beyond_window']}")
+
+
+def parse_args() -> dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Sweep bit flips over AES ciphertexts and summarize "
+                                                 + "the error propagation of every mode.")
+    parser.add_argument('--size', type=int, default=1 << 20, help='size of the random plain text [B]', required=False)
+    parser.add_argument('--modes', nargs='+', choices=MODES.keys(), default=['ECB', 'CBC', 'OFB', 'CFB', 'CTR'],
+                        help='modes to sweep, the authenticated ones decrypt the whole message per flip',
+                        required=False)
+    parser.add_argument('--samples', type=int, help='amount of random bits to flip, every bit when not given',
+                        required=False)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the plain text, key and samples', required=False)
+    parser.add_argument('--workers', type=int, help='amount of processes', required=False)
+    parser.add_argument('--window', type=int, default=WINDOW_BLOCKS, help='blocks compared after every flip',
+                        required=False)
+    parser.add_argument('--output', help='save the summaries to a JSON file', required=False)
+
+    return vars(parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    rng = np.random.default_rng(args['seed'])
+    data = rng.bytes(args['size'])
+    summaries = []
+
+    for name in args['modes']:
+        key = rng.bytes(MODES[name].KEY_SIZE)
+        summaries.append(sweep(name, data, key, args['samples'], args['seed'], args['workers'],
+                               window_blocks=args['window']))
+        print_summary(summaries[-1])
+
+    if args['output']:
+        with open(args['output'], 'w') as f:
+            json.dump(summaries, f, indent=2)
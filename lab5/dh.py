@@ -1,10 +1,30 @@
-from math import sqrt
-from typing import Union
-
+import argparse as argp
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import perf_counter_ns
+from typing import Any, Optional, Union
+
+import numpy as np
 from Cryptodome.Random.random import getrandbits
 
-from lab3.bbs import BBS
+from lab3.bbs import BBS, small_primes
 from lab4.aes_tests import current_ms, duration_ms
+from lab5.modp_groups import GENERATOR, GROUPS, group_prime
+
+""" Odd primes crossing out the safe prime candidates, a deeper sieve than the one of `BBS.sieved_prime` pays off
+    as every survivor costs a full size exponentiation and only about one in (ln p)^2 of them is a safe prime.
+"""
+SAFE_SIEVE_PRIMES = np.array(small_primes(1 << 20)[1:], dtype=np.int64)
+SAFE_SIEVE_WINDOW = 1 << 15
+""" Bits per digit of the fixed-base tables and amount of plain powers of a group root computed before its table
+    is built, building a 8 bit window table costs about as much as 40 plain powers (see `lab5.dh_bench`).
+"""
+FIXED_BASE_WINDOW = 8
+FIXED_BASE_AFTER = 40
+DEFAULT_GROUP = 'ffdhe2048'
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.pod-lab', 'dh')
 
 
 class DiffiHelman:
@@ -12,56 +32,198 @@ class DiffiHelman:
 
     @staticmethod
     def find_coprimes(modulo: int) -> set[int]:
+        """
+        Prime factors of the modulo found by trial division.
+        """
         out = set()
 
         while modulo % 2 == 0:
             out.add(2)
             modulo //= 2
 
-        for i in range(3, int(sqrt(modulo)), 2):
+        i = 3
+
+        while i * i <= modulo:
             while modulo % i == 0:
                 out.add(i)
                 modulo //= i
 
+            i += 2
+
         if modulo > 2:
             out.add(modulo)
 
         return out
 
     @staticmethod
-    def first_primitive_root(modulo: int) -> Union[int, None]:
+    def first_primitive_root(modulo: int, factors: set[int] = None) -> Union[int, None]:
+        """
+        Smallest primitive root of the prime modulo, r is one when r^(phi / f) != 1 for every prime factor f of phi.
+
+        :param factors: prime factors of modulo - 1, found by trial division when not given
+        """
         phi = modulo - 1
 
-        coprimes = DiffiHelman.find_coprimes(phi)
+        coprimes = factors if factors is not None else DiffiHelman.find_coprimes(phi)
 
         for r in range(2, phi + 1):
-            for it in coprimes:
-                if pow(r, phi // it, modulo) != 1:
-                    return r
+            if all(pow(r, phi // it, modulo) != 1 for it in coprimes):
+                return r
+
+        return None
+
+    @staticmethod
+    def search_safe_prime(bit_size: int, rounds: int = 40,
+                          window: int = SAFE_SIEVE_WINDOW) -> Optional[tuple[int, int]]:
+        """
+        Look for a safe prime p = 2q + 1 in one window of candidates q walked from a random start.
+        Candidates where q or p is divisible by a small prime are crossed out together, the survivors go through
+        a Fermat test of q and of p before the Miller-Rabin test of q. With q prime, 2^(p - 1) = 1 (mod p) and
+        p not divisible by 3 prove p prime (Pocklington), so p needs no more rounds.
+
+        :param bit_size: exact bit size of the safe prime, at least 3
+        :param rounds: iterations of the prime probability test of q (Miller-Robin)
+        :param window: amount of candidates in the window
+        :return: the safe prime and the prime q, None when the window holds none
+        """
+        if bit_size < 3:
+            raise ValueError("bit size of a safe prime must be at least 3")
+
+        low, high = 1 << (bit_size - 2), 1 << (bit_size - 1)
+        start = (low | getrandbits(bit_size - 2)) | 1
+        count = min(window, (high - 1 - start) // 2 + 1)
+
+        # q = start + 2j is divisible by s for j = -start / 2 and p = 2q + 1 for j = -(2 start + 1) / 4 (mod s),
+        # primes from the low bound up could be q itself, the sieve gets deeper as the tests get more expensive
+        primes = SAFE_SIEVE_PRIMES[SAFE_SIEVE_PRIMES < min(low, bit_size ** 2)]
+        residues = np.array([start % s for s in primes.tolist()], dtype=np.int64)
+        halves = (primes + 1) // 2
+        composite = np.zeros(count, dtype=bool)
+
+        for (s, q_offset, p_offset) in zip(primes.tolist(), (-residues * halves % primes).tolist(),
+                                           (-(2 * residues + 1) * (halves * halves % primes) % primes).tolist()):
+            composite[q_offset::s] = True
+            composite[p_offset::s] = True
+
+        for j in np.flatnonzero(~composite).tolist():
+            q = start + 2 * j
+            prime = 2 * q + 1
+
+            if pow(2, q - 1, q) == 1 and prime % 3 and pow(2, prime - 1, prime) == 1 \
+                    and BBS.is_probably_prime(q, rounds):
+                return prime, q
 
         return None
 
     @staticmethod
-    def random_arguments(prime_bit_size: int = 16) -> (int, int):
-        prime = DiffiHelman.random_prime(prime_bit_size)
+    def safe_prime(bit_size: int, rounds: int = 40, workers: int = 1) -> tuple[int, int]:
+        """
+        Generate a random safe prime p = 2q + 1 with q prime, so the factors of p - 1 are known to be 2 and q.
+
+        :param bit_size: exact bit size of the safe prime
+        :param rounds: iterations of the prime probability test of q (Miller-Robin)
+        :param workers: amount of processes searching windows at the same time
+        :return: the safe prime and the prime q
+        """
+        if workers <= 1:
+            found = None
+
+            while found is None:
+                found = DiffiHelman.search_safe_prime(bit_size, rounds)
+
+            return found
+
+        with ProcessPoolExecutor(workers) as pool:
+            pending = {pool.submit(DiffiHelman.search_safe_prime, bit_size, rounds) for _ in range(2 * workers)}
+
+            while True:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if (found := future.result()) is not None:
+                        for other in pending:
+                            other.cancel()
+
+                        return found
+
+                    pending.add(pool.submit(DiffiHelman.search_safe_prime, bit_size, rounds))
+
+    @staticmethod
+    def is_safe_prime(prime: int, rounds: int = 40) -> bool:
+        """
+        Check if p = 2q + 1 with q prime, p is proven prime by Pocklington once q is.
+        """
+        return prime > 4 and prime % 2 == 1 and prime % 3 != 0 and pow(2, prime - 1, prime) == 1 \
+            and BBS.is_probably_prime((prime - 1) // 2, rounds)
+
+    @staticmethod
+    def is_generator(root: int, prime: int, order: int) -> bool:
+        """
+        Check if the root generates the whole group of the safe prime p = 2 * order + 1, the order of an element
+        divides 2 * order, so it is full unless root^2 or root^order is 1.
+        """
+        return 1 < root < prime and pow(root, 2, prime) != 1 and pow(root, order, prime) != 1
+
+    @staticmethod
+    def safe_generator(prime: int, order: int) -> int:
+        """
+        Smallest generator of the group of the safe prime p = 2 * order + 1.
+        """
+        return next(r for r in range(2, prime) if DiffiHelman.is_generator(r, prime, order))
+
+    @staticmethod
+    def random_arguments(prime_bit_size: int = 16, workers: int = 1) -> (int, int):
+        """
+        Generate a safe prime and its smallest generator.
 
-        return prime, DiffiHelman.first_primitive_root(prime)
+        :param workers: amount of processes searching for the safe prime
+        """
+        prime, order = DiffiHelman.safe_prime(prime_bit_size, workers=workers)
+
+        return prime, DiffiHelman.safe_generator(prime, order)
+
+    @staticmethod
+    def group(group: Union[str, int, 'Group'] = DEFAULT_GROUP, cache: 'GroupCache' = None) -> 'Group':
+        """
+        Resolve a group without generating one when it's known.
+
+        :param group: name of a standard group (one of `GROUPS`), bit size of a cached group (generated and stored
+                      when missing) or a group object
+        :param cache: cache of the generated groups, the shared one in `DEFAULT_DIRECTORY` when not given
+        """
+        if isinstance(group, Group):
+            return group
+
+        if isinstance(group, str):
+            if group not in PRESETS:
+                raise ValueError(f"unknown group '{group}', use one of {tuple(PRESETS)} or a bit size")
+
+            return PRESETS[group]
+
+        return (cache or GroupCache.shared()).group(group)
 
     @staticmethod
-    def intermediate_keys(prime: int, root: int, bit_size: int = 256) -> (int, int):
+    def intermediate_keys(prime: int, root: int, bit_size: int = 256, group: 'Group' = None) -> (int, int):
+        """
+        :param group: group of the prime and root, its powers go through the fixed-base table of the group
+        """
         rand = getrandbits(bit_size)
 
-        return rand, pow(root, rand, prime)
+        return rand, group.power(rand, bit_size) if group is not None else pow(root, rand, prime)
 
     @staticmethod
     def session_key(private: int, public: int, prime: int) -> int:
         return pow(public, private, prime)
 
     @staticmethod
-    def test(prime_bit_size: int = 20) -> None:
-        start = current_ms()
-        prime, root = DiffiHelman.random_arguments(prime_bit_size)
-        print(f"'n' and 'g' generation time = {duration_ms(start)} [ms]")
+    def test(group: Union[str, int, 'Group'] = DEFAULT_GROUP, cache: 'GroupCache' = None) -> None:
+        """
+        :param group: standard group name, cached group bit size or group object, see `DiffiHelman.group`
+        """
+        start = perf_counter_ns()
+        group = DiffiHelman.group(group, cache)
+        prime, root = group.prime, group.root
+        print(f"'n' and 'g' lookup time = {(perf_counter_ns() - start) / 1000} [us] ({group.name})")
 
         print(f"n = {prime}, g = {root}")
 
@@ -80,15 +242,216 @@ class DiffiHelman:
         assert a_key == b_key, "keys differ"
 
 
+class FixedBase:
+    def __init__(self, base: int, modulus: int, exponent_bits: int = 256, window: int = FIXED_BASE_WINDOW):
+        """
+        Fixed-base windowed exponentiation. The table holds base^(d * 2^(window * i)) for every digit d of every
+        window i of the exponent, so a power is a product of one entry per nonzero digit without any squarings.
+
+        :param exponent_bits: largest exponent served by the table, larger ones fall back to pow
+        :param window: bits per digit, every window takes 2^window entries
+        """
+        self.base = base % modulus
+        self.modulus = modulus
+        self.window = window
+        self.windows = -(-exponent_bits // window)
+        self.exponent_bits = self.windows * window
+        self.table: list[list[int]] = []
+
+        row_base = self.base
+
+        for _ in range(self.windows):
+            row = [1] * (1 << window)
+
+            for digit in range(1, 1 << window):
+                row[digit] = row[digit - 1] * row_base % modulus
+
+            self.table.append(row)
+            row_base = row[-1] * row_base % modulus
+
+    def pow(self, exponent: int) -> int:
+        if exponent < 0 or exponent.bit_length() > self.exponent_bits:
+            return pow(self.base, exponent, self.modulus)
+
+        result, mask = 1, (1 << self.window) - 1
+
+        for row in self.table:
+            if digit := exponent & mask:
+                result = result * row[digit] % self.modulus
+
+            exponent >>= self.window
+
+        return result
+
+
+class Group:
+    def __init__(self, prime: int, root: int, order: int, name: str = None):
+        """
+        Diffi-Helman group over the safe prime p = 2q + 1, the root generates a subgroup of given order,
+        q for the standard groups and the whole 2q for the generated ones.
+        """
+        self.prime = prime
+        self.root = root
+        self.order = order
+        self.name = name or f'{prime.bit_length()}-bit'
+
+        self.__fixed_bases: dict[int, FixedBase] = {}
+        self.__powers = 0
+
+    @property
+    def bit_size(self) -> int:
+        return self.prime.bit_length()
+
+    def fixed_base(self, exponent_bits: int = 256) -> FixedBase:
+        """
+        Fixed-base table of the root for exponents of given size, built on the first call.
+        Concurrent first calls may build it twice, only one of the tables is kept.
+        """
+        if (fixed_base := self.__fixed_bases.get(exponent_bits)) is None:
+            fixed_base = self.__fixed_bases.setdefault(exponent_bits, FixedBase(self.root, self.prime, exponent_bits))
+
+        return fixed_base
+
+    def power(self, exponent: int, exponent_bits: int = 256) -> int:
+        """
+        root^exponent mod prime, computed with plain pow until `FIXED_BASE_AFTER` powers paid for the table.
+
+        :param exponent_bits: size of the exponents the table is built for
+        """
+        if exponent_bits not in self.__fixed_bases and self.__powers < FIXED_BASE_AFTER:
+            self.__powers += 1
+
+            return pow(self.root, exponent, self.prime)
+
+        return self.fixed_base(exponent_bits).pow(exponent)
+
+    def is_valid(self, rounds: int = 40) -> bool:
+        """
+        Check the prime is safe and the root has the stated order.
+        """
+        q = (self.prime - 1) // 2
+
+        if self.order not in (q, 2 * q) or not DiffiHelman.is_safe_prime(self.prime, rounds):
+            return False
+
+        return 1 < self.root < self.prime - 1 and pow(self.root, self.order, self.prime) == 1 \
+            and (self.order == q or pow(self.root, q, self.prime) != 1)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'name': self.name, 'prime': hex(self.prime), 'root': self.root, 'order': hex(self.order)}
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> 'Group':
+        return Group(int(data['prime'], 16), data['root'], int(data['order'], 16), data['name'])
+
+
+PRESETS = {name: Group(group_prime(name), GENERATOR, (group_prime(name) - 1) // 2, name) for name in GROUPS}
+
+
+class GroupCache:
+    __shared: Optional['GroupCache'] = None
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, workers: int = 1):
+        """
+        On-disk cache of generated and validated groups keyed by bit size. Loaded groups stay in memory,
+        so every lookup of a bit size gives the same group object.
+
+        :param directory: directory holding one file per bit size
+        :param workers: amount of processes searching for the safe prime of a missing group
+        """
+        self.directory = directory
+        self.workers = workers
+
+        self.__lock = threading.Lock()
+        self.__groups: dict[int, Group] = {}
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def shared() -> 'GroupCache':
+        """
+        Cache in the default directory shared by the whole process.
+        """
+        if GroupCache.__shared is None:
+            GroupCache.__shared = GroupCache()
+
+        return GroupCache.__shared
+
+    def path(self, bit_size: int) -> str:
+        return os.path.join(self.directory, f'{bit_size}.json')
+
+    def get(self, bit_size: int) -> Optional[Group]:
+        """
+        Cached group of given bit size or None, the stored groups were validated when added,
+        loading checks only their shape.
+        """
+        if (group := self.__groups.get(bit_size)) is not None:
+            return group
+
+        path = self.path(bit_size)
+
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r') as f:
+            group = Group.from_dict(json.load(f))
+
+        if group.bit_size != bit_size or group.order not in ((group.prime - 1) // 2, group.prime - 1):
+            return None
+
+        return self.__groups.setdefault(bit_size, group)
+
+    def add(self, group: Group) -> None:
+        """
+        Validate and store the group, replacing the one of the same bit size.
+
+        :raises ValueError: When the prime isn't safe or the root doesn't have the stated order.
+        """
+        if not group.is_valid():
+            raise ValueError("the group must be over a safe prime with a root of the stated order")
+
+        path = self.path(group.bit_size)
+
+        # written aside and renamed, so other processes never read a partial file
+        with open(f'{path}.{os.getpid()}.tmp', 'w') as f:
+            json.dump(group.to_dict(), f)
+
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+        self.__groups[group.bit_size] = group
+
+    def group(self, bit_size: int) -> Group:
+        """
+        Cached group of given bit size, a missing one is generated, validated and stored.
+        """
+        with self.__lock:
+            if (group := self.get(bit_size)) is None:
+                prime, root = DiffiHelman.random_arguments(bit_size, workers=self.workers)
+                group = Group(prime, root, prime - 1)
+                self.add(group)
+
+        return group
+
+
 class Application:
-    def __init__(self, prime: int, root: int):
+    def __init__(self, prime: int, root: int, group: Group = None):
         self.prime = prime
         self.root = root
+        self.group = group
 
         self.__private_key, self.public_key, self.session_key = 0, 0, 0
 
+    @staticmethod
+    def from_group(group: Union[str, int, Group] = DEFAULT_GROUP, cache: GroupCache = None) -> 'Application':
+        """
+        :param group: standard group name, cached group bit size or group object, see `DiffiHelman.group`
+        """
+        group = DiffiHelman.group(group, cache)
+
+        return Application(group.prime, group.root, group)
+
     def generate_public_key(self, private_bit_size: int = 256) -> int:
-        self.__private_key, self.public_key = DiffiHelman.intermediate_keys(self.prime, self.root, private_bit_size)
+        self.__private_key, self.public_key = DiffiHelman.intermediate_keys(self.prime, self.root, private_bit_size,
+                                                                            self.group)
 
         return self.public_key
 
@@ -96,13 +459,14 @@ class Application:
         self.session_key = DiffiHelman.session_key(self.__private_key, public_key, self.prime)
 
 
-def main() -> None:
-    prime, root = DiffiHelman.random_arguments(56)
+def main(group: Union[str, int] = DEFAULT_GROUP, cache: GroupCache = None) -> None:
+    start = current_ms()
+    a = Application.from_group(group, cache)
+    print(f"group lookup time = {duration_ms(start)} [ms]")
 
-    print(f"n = {prime}, g = {root}")
+    print(f"n = {a.prime}, g = {a.root}")
 
-    a = Application(prime, root)
-    b = Application(prime, root)
+    b = Application.from_group(a.group)
 
     a.generate_public_key()
     b.generate_public_key()
@@ -115,8 +479,23 @@ def main() -> None:
     print(f"a key = {a.session_key}, b key = {b.session_key}")
 
 
+def get_command_line_args() -> dict[str, Any]:
+    parser = argp.ArgumentParser(description="Diffi-Helman key exchange over a safe prime group.")
+
+    parser.add_argument('--group', type=str, default=DEFAULT_GROUP,
+                        help=f'standard group ({", ".join(GROUPS)}) or bit size of a cached (generated) group')
+    parser.add_argument('--dir', type=str, metavar='DIRECTORY', default=DEFAULT_DIRECTORY, help='group cache directory')
+    parser.add_argument('--workers', type=int, default=1, help='amount of processes searching for a new safe prime')
+
+    return vars(parser.parse_args())
+
+
 if __name__ == '__main__':
-    main()
+    args = get_command_line_args()
+    group = int(args['group']) if args['group'].isdigit() else args['group']
+    cache = GroupCache(args['dir'], args['workers']) if isinstance(group, int) else None
+
+    main(group, cache)
 
     print("\nTest:")
-    DiffiHelman.test(56)
+    DiffiHelman.test(group, cache)
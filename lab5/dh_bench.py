@@ -0,0 +1,93 @@
+import argparse as argp
+import json
+import math
+from typing import Any, Union
+
+import numpy as np
+from Cryptodome.Random.random import getrandbits
+
+from lab4.aes_tests import measure
+from lab5.dh import DEFAULT_DIRECTORY, DiffiHelman, FixedBase, GroupCache
+
+KEY_COUNTS = (1, 10, 100, 1000, 10000)
+
+
+def bench_group(group: Union[str, int], windows: list[int], exponent_bits: int = 256, keys: int = 200,
+                repeat: int = 5, cache: GroupCache = None) -> list[dict[str, Any]]:
+    """
+    Compare plain pow with the fixed-base tables of the group root for every window size.
+
+    :param group: standard group name or cached group bit size
+    :param windows: bits per digit of the measured tables
+    :param exponent_bits: size of the private keys
+    :param keys: amount of powers in one measured run
+    :param repeat: amount of measured runs
+    :return: per key times in microseconds, build time in milliseconds and the amount of keys from which
+             building the table pays off
+    """
+    group = DiffiHelman.group(group, cache)
+    exponents = [getrandbits(exponent_bits) for _ in range(keys)]
+
+    samples, expected = measure(lambda: [pow(group.root, e, group.prime) for e in exponents], repeat)
+    pow_us = float(np.median(samples)) / keys / 1000
+    results = []
+
+    for window in windows:
+        build, fixed_base = measure(lambda: FixedBase(group.root, group.prime, exponent_bits, window), repeat, 0)
+        samples, powers = measure(lambda: [fixed_base.pow(e) for e in exponents], repeat)
+
+        assert powers == expected, f"fixed-base powers differ from pow for the window {window}"
+
+        table_us = float(np.median(samples)) / keys / 1000
+        build_ms = float(np.median(build)) / 1e6
+
+        results.append({'group': group.name, 'bits': group.bit_size, 'exponent_bits': exponent_bits,
+                        'window': window, 'entries': fixed_base.windows << window,
+                        'pow_us': round(pow_us, 1), 'table_us': round(table_us, 1),
+                        'speedup': round(pow_us / table_us, 2), 'build_ms': round(build_ms, 2),
+                        'crossover_keys': math.ceil(build_ms * 1000 / (pow_us - table_us))
+                        if pow_us > table_us else None})
+
+    return results
+
+
+def print_results(results: list[dict[str, Any]], key_counts: tuple[int, ...] = KEY_COUNTS) -> None:
+    for result in results:
+        print(f"{result['group']} window={result['window']}...\tpow = {result['pow_us']} [us], "
+              + f"table = {result['table_us']} [us] ({result['speedup']}x), build = {result['build_ms']} [ms] "
+              + f"({result['entries']} entries), pays off from {result['crossover_keys']} keys")
+
+        totals = ', '.join(f"{n}: {n * result['pow_us'] / 1000:.1f} / "
+                           + f"{result['build_ms'] + n * result['table_us'] / 1000:.1f}" for n in key_counts)
+        print(f"\tkeys: pow / build + table [ms] = {totals}")
+
+
+def get_command_line_args() -> dict[str, Any]:
+    parser = argp.ArgumentParser(description="Benchmark fixed-base tables against plain pow "
+                                             + "for the Diffi-Helman public keys.")
+
+    parser.add_argument('--groups', type=str, nargs='+', default=['ffdhe2048', 'ffdhe3072', 'ffdhe4096'],
+                        help='standard groups or bit sizes of cached (generated) groups')
+    parser.add_argument('--windows', type=int, nargs='+', default=[4, 6, 8], help='bits per digit of the tables')
+    parser.add_argument('--exponent', type=int, default=256, help='bit size of the private keys')
+    parser.add_argument('--keys', type=int, default=200, help='amount of keys per measured run')
+    parser.add_argument('--repeat', type=int, default=5, help='amount of measured runs')
+    parser.add_argument('--dir', type=str, metavar='DIRECTORY', default=DEFAULT_DIRECTORY, help='group cache directory')
+    parser.add_argument('--output', type=str, help='save the results to a JSON file')
+
+    return vars(parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = get_command_line_args()
+    groups = [int(group) if group.isdigit() else group for group in args['groups']]
+    cache = GroupCache(args['dir']) if any(isinstance(group, int) for group in groups) else None
+    results = []
+
+    for group in groups:
+        results.extend(bench_group(group, args['windows'], args['exponent'], args['keys'], args['repeat'], cache))
+        print_results(results[-len(args['windows']):])
+
+    if args['output']:
+        with open(args['output'], 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,348 @@
+""" Every message is a 4 byte big endian length followed by the payload. The client sends its public key,
+    the server answers with its public key and the sha256 of the session key, which the client compares
+    with its own to confirm the exchange.
+"""
+
+import argparse as argp
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Union
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from lab5.dh import DEFAULT_DIRECTORY, DEFAULT_GROUP, Application, DiffiHelman, Group, GroupCache
+
+HEADER = struct.Struct('>I')
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+TIMEOUT = 60
+BACKLOG = 4096
+
+_group: Optional[Group] = None
+
+
+def init_worker(group: Union[str, int], directory: str = DEFAULT_DIRECTORY, private_bit_size: int = 256) -> None:
+    """
+    Resolve the group once in every worker process and build its fixed-base table up front,
+    the worker serves the public keys of many handshakes.
+    """
+    global _group
+
+    _group = DiffiHelman.group(group, GroupCache(directory) if isinstance(group, int) else None)
+    _group.fixed_base(private_bit_size)
+
+
+def worker_public_key(private_bit_size: int = 256) -> (int, int):
+    return DiffiHelman.intermediate_keys(_group.prime, _group.root, private_bit_size, _group)
+
+
+def worker_session_key(private: int, public: int) -> int:
+    return DiffiHelman.session_key(private, public, _group.prime)
+
+
+def worker_handshake(peer_public: int, private_bit_size: int = 256) -> (int, int):
+    """
+    Server side of a handshake in a worker process.
+
+    :return: public key and session key of the server
+    """
+    application = Application.from_group(_group)
+    application.generate_public_key(private_bit_size)
+    application.digest_public_key(peer_public)
+
+    return application.public_key, application.session_key
+
+
+def key_size(group: Group) -> int:
+    return (group.bit_size + 7) // 8
+
+
+def encode(value: int, group: Group) -> bytes:
+    return value.to_bytes(key_size(group), 'big')
+
+
+def decode_public_key(payload: bytes, group: Group) -> int:
+    """
+    :raises ValueError: When the payload isn't a public key of the group.
+    """
+    value = int.from_bytes(payload, 'big')
+
+    if len(payload) != key_size(group) or not 1 < value < group.prime - 1:
+        raise ValueError("the public key isn't an element of the group")
+
+    return value
+
+
+def confirmation(session_key: int, group: Group) -> bytes:
+    return hashlib.sha256(encode(session_key, group)).digest()
+
+
+async def read_message(reader: asyncio.StreamReader, limit: int) -> bytes:
+    """
+    :raises ValueError: When the message is longer than the limit.
+    """
+    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+
+    if length > limit:
+        raise ValueError(f"message of {length}B exceeds the limit of {limit}B")
+
+    return await reader.readexactly(length)
+
+
+async def write_message(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    writer.write(HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+def worker_pool(group: Union[str, int], directory: str = DEFAULT_DIRECTORY, workers: int = None,
+                private_bit_size: int = 256) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(workers or os.cpu_count(), initializer=init_worker,
+                               initargs=(group, directory, private_bit_size))
+
+
+class Server:
+    def __init__(self, group: Union[str, int] = DEFAULT_GROUP, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 workers: int = None, directory: str = DEFAULT_DIRECTORY, private_bit_size: int = 256):
+        """
+        Diffi-Helman key exchange server, the exponentiations of every handshake run in a process pool,
+        so the event loop only moves the messages of the concurrent sessions.
+
+        :param group: standard group name or cached group bit size, see `DiffiHelman.group`
+        :param port: port to listen on, 0 picks a free one
+        :param workers: amount of worker processes, the default is the cpu count
+        :param directory: group cache directory
+        """
+        self.group = DiffiHelman.group(group, GroupCache(directory) if isinstance(group, int) else None)
+        self.host = host
+        self.port = port
+        self.private_bit_size = private_bit_size
+        self.handshakes, self.failures = 0, 0
+
+        self.__pool = worker_pool(group, directory, workers, private_bit_size)
+        self.__server: Optional[asyncio.AbstractServer] = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+
+        try:
+            payload = await asyncio.wait_for(read_message(reader, key_size(self.group)), TIMEOUT)
+            public, session_key = await loop.run_in_executor(self.__pool, worker_handshake,
+                                                             decode_public_key(payload, self.group),
+                                                             self.private_bit_size)
+
+            await write_message(writer, encode(public, self.group))
+            await write_message(writer, confirmation(session_key, self.group))
+            self.handshakes += 1
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            self.failures += 1
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self.__server = await asyncio.start_server(self.handle, self.host, self.port, backlog=BACKLOG)
+        self.port = self.__server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self.__server is None:
+            await self.start()
+
+        await self.__server.serve_forever()
+
+    async def close(self) -> None:
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+        self.__pool.shutdown()
+
+
+class Client:
+    def __init__(self, group: Union[str, int] = DEFAULT_GROUP, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 pool: ProcessPoolExecutor = None, directory: str = DEFAULT_DIRECTORY, private_bit_size: int = 256):
+        """
+        Diffi-Helman key exchange client, many handshakes can run concurrently on one client.
+
+        :param group: the group of the server, see `DiffiHelman.group`
+        :param pool: worker pool of the exponentiations, made by `worker_pool` for the same group,
+                     they run in the event loop when not given
+        """
+        self.group = DiffiHelman.group(group, GroupCache(directory) if isinstance(group, int) else None)
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.private_bit_size = private_bit_size
+
+    async def __public_key(self) -> (int, int):
+        if self.pool is None:
+            return DiffiHelman.intermediate_keys(self.group.prime, self.group.root, self.private_bit_size, self.group)
+
+        return await asyncio.get_running_loop().run_in_executor(self.pool, worker_public_key, self.private_bit_size)
+
+    async def __session_key(self, private: int, public: int) -> int:
+        if self.pool is None:
+            return DiffiHelman.session_key(private, public, self.group.prime)
+
+        return await asyncio.get_running_loop().run_in_executor(self.pool, worker_session_key, private, public)
+
+    async def handshake(self) -> int:
+        """
+        Exchange the keys with the server.
+
+        :return: the session key
+        :raises ValueError: When the server sent an invalid key or the session keys differ.
+        """
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), TIMEOUT)
+
+        try:
+            private, public = await self.__public_key()
+            await write_message(writer, encode(public, self.group))
+
+            peer_public = decode_public_key(await asyncio.wait_for(read_message(reader, key_size(self.group)),
+                                                                   TIMEOUT), self.group)
+            expected = await asyncio.wait_for(read_message(reader, hashlib.sha256().digest_size), TIMEOUT)
+            session_key = await self.__session_key(private, peer_public)
+        finally:
+            writer.close()
+
+        if confirmation(session_key, self.group) != expected:
+            raise ValueError("the session keys differ")
+
+        return session_key
+
+
+def raise_open_files_limit(needed: int) -> None:
+    """
+    Raise the soft limit of the open files up to the hard one, every concurrent session takes two sockets.
+    """
+    if resource is None:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if soft < needed:
+        soft = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+async def load_test(count: int = 2000, concurrency: int = 1000, group: Union[str, int] = DEFAULT_GROUP,
+                    workers: int = None, directory: str = DEFAULT_DIRECTORY, warmup: int = 50,
+                    host: str = DEFAULT_HOST, port: int = None) -> dict[str, Any]:
+    """
+    Run handshakes with at most `concurrency` of them in flight at once, against a local server started on
+    a free port or the server on the given port.
+
+    :param count: amount of measured handshakes
+    :param workers: amount of worker processes of the server and of the clients
+    :param warmup: amount of handshakes before the measured ones, they start the worker processes
+    :return: handshakes per second and latency percentiles in milliseconds
+    """
+    raise_open_files_limit(4 * concurrency + 256)
+
+    server = None
+
+    if port is None:
+        server = Server(group, host, 0, workers, directory)
+        await server.start()
+        port = server.port
+
+    pool = worker_pool(group, directory, workers)
+    client = Client(group, host, port, pool, directory)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def session() -> None:
+        async with semaphore:
+            start = time.perf_counter_ns()
+
+            try:
+                await client.handshake()
+                latencies.append(time.perf_counter_ns() - start)
+            except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as error:
+                errors.append(type(error).__name__)
+
+    try:
+        await asyncio.gather(*(session() for _ in range(warmup)))
+        latencies.clear()
+        errors.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session() for _ in range(count)))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+        if server is not None:
+            await server.close()
+
+    ms = np.array(latencies) / 1e6 if latencies else np.zeros(1)
+
+    return {'group': client.group.name, 'handshakes': len(latencies), 'errors': len(errors),
+            'concurrency': concurrency, 'workers': workers or os.cpu_count(), 'seconds': round(elapsed, 3),
+            'handshakes_s': round(len(latencies) / elapsed, 1),
+            **{f'p{p}_ms': round(float(np.percentile(ms, p)), 2) for p in (50, 90, 99)},
+            'max_ms': round(float(ms.max()), 2)}
+
+
+def print_results(results: dict[str, Any]) -> None:
+    print(f"{results['group']}...\t{results['handshakes']} handshakes ({results['errors']} errors) "
+          + f"in {results['seconds']} [s], concurrency = {results['concurrency']}, workers = {results['workers']}")
+    print(f"\t{results['handshakes_s']} [handshakes/s], latency p50 = {results['p50_ms']}, "
+          + f"p90 = {results['p90_ms']}, p99 = {results['p99_ms']}, max = {results['max_ms']} [ms]")
+
+
+def get_command_line_args() -> dict[str, Any]:
+    parser = argp.ArgumentParser(description="Diffi-Helman key exchange service over TCP.")
+
+    parser.add_argument('--mode', choices=('serve', 'handshake', 'bench'), default='bench',
+                        help='run the server, a single client handshake or the local load generator')
+    parser.add_argument('--group', type=str, default=DEFAULT_GROUP,
+                        help='standard group or bit size of a cached (generated) group')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='address of the server')
+    parser.add_argument('--port', type=int, help=f'port of the server, {DEFAULT_PORT} when serving, '
+                                                 + 'the bench starts its own server when not given')
+    parser.add_argument('--workers', type=int, help='amount of worker processes, the default is the cpu count')
+    parser.add_argument('--count', type=int, default=2000, help='amount of measured handshakes of the bench')
+    parser.add_argument('--concurrency', type=int, default=1000, help='handshakes in flight at once in the bench')
+    parser.add_argument('--dir', type=str, metavar='DIRECTORY', default=DEFAULT_DIRECTORY, help='group cache directory')
+    parser.add_argument('--output', type=str, help='save the bench results to a JSON file')
+
+    return vars(parser.parse_args())
+
+
+async def run(args: dict[str, Any]) -> None:
+    group = int(args['group']) if args['group'].isdigit() else args['group']
+
+    if args['mode'] == 'serve':
+        server = Server(group, args['host'], args['port'] or DEFAULT_PORT, args['workers'], args['dir'])
+        await server.start()
+        print(f"serving {server.group.name} on {server.host}:{server.port}")
+
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+    elif args['mode'] == 'handshake':
+        client = Client(group, args['host'], args['port'] or DEFAULT_PORT, directory=args['dir'])
+        print(f"session key = {await client.handshake()}")
+    else:
+        results = await load_test(args['count'], args['concurrency'], group, args['workers'], args['dir'],
+                                  host=args['host'], port=args['port'])
+        print_results(results)
+
+        if args['output']:
+            with open(args['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(run(get_command_line_args()))
@@ -34,9 +34,11 @@ class RSA:
         return x % phi if g == 1 else None
 
     @staticmethod
-    def generate_keys(extract_phi=False) -> ((int, int), (int, int)):
-        p = random_prime(256)
-        q = random_prime(256)
+    def generate_keys(extract_phi=False, pool=None) -> ((int, int), (int, int)):
+        """
+        :param pool: `lab3.prime_pool.PrimePool` to take p and q from instead of searching for them
+        """
+        p, q = pool.take(256, 2) if pool is not None else (random_prime(256), random_prime(256))
 
         n = p * q
         phi = (p - 1) * (q - 1)
@@ -1,4 +1,4 @@
-from random import sample
+from random import Random, sample
 
 from Cryptodome.Random.random import randint as randint_range
 from Cryptodome.Util.number import getRandomInteger as randint_bits
@@ -66,8 +66,9 @@ def div_mod(num, den, p):
 
 class Trivial:
     @staticmethod
-    def split(secret: int, k: int, n: int) -> [int]:
-        s = [randint_range(0, k - 1) for _ in range(n - 1)]
+    def split(secret: int, k: int, n: int, rng: Random = None) -> [int]:
+        randint = rng.randint if rng else randint_range
+        s = [randint(0, k - 1) for _ in range(n - 1)]
         sn = (secret - sum(s)) % k
 
         return s + [sn]
@@ -98,8 +99,9 @@ class Trivial:
 
 class Schamir:
     @staticmethod
-    def split(secret: int, n: int, t: int, p: int) -> ([int], int):
-        a = [randint_range(0, 10) for _ in range(t - 1)] + [secret]
+    def split(secret: int, n: int, t: int, p: int, rng: Random = None) -> ([int], int):
+        randint = rng.randint if rng else randint_range
+        a = [randint(0, 10) for _ in range(t - 1)] + [secret]
 
         return [(i, polynomial(i, a) % p) for i in range(1, n + 1)], p
 
@@ -147,12 +149,13 @@ class Schamir:
 
 class SimpleSchamir:
     @staticmethod
-    def split(n: int, t: int, secret: int, rand_max: int = 10 ** 5) -> [(int, int)]:
-        cfs = [randint_range(0, rand_max) for _ in range(t - 1)] + [secret]
+    def split(n: int, t: int, secret: int, rand_max: int = 10 ** 5, rng: Random = None) -> [(int, int)]:
+        randint = rng.randint if rng else randint_range
+        cfs = [randint(0, rand_max) for _ in range(t - 1)] + [secret]
 
         shares = []
         for i in range(1, n + 1):
-            r = randint_range(1, rand_max)
+            r = randint(1, rand_max)
             shares.append((r, polynomial(r, cfs)))
 
         return shares
@@ -1,4 +1,4 @@
-from random import choice
+from random import Random
 
 import numpy as np
 from PIL import Image
@@ -14,9 +14,11 @@ def is_considered_black(pixel: int) -> bool:
 
 
 class BitmapSplitter:
-    def __init__(self, path: str):
-        """ Open image from given path and prepare a pixel matrix
+    def __init__(self, path: str, rng: Random = None):
+        """ Open image from given path and prepare a pixel matrix.
+            The shares are drawn from given random source (ex. `lab3.bbs.BBSRandom`).
         """
+        self.rng = rng or Random()
         self.path = path
         self.image = Image.open(self.path)
         self.pixels = np.array(self.image)
@@ -35,7 +37,7 @@ class BitmapSplitter:
         for x in range(height):
             for y in range(width):
                 if is_considered_black(self.pixels[x, y]):
-                    black1, black2 = choice(black_variants)  # random black combnation
+                    black1, black2 = self.rng.choice(black_variants)  # random black combnation
 
                     share1[x, position] = black1[0]
                     share1[x, position + 1] = black1[1]
@@ -43,7 +45,7 @@ class BitmapSplitter:
                     share2[x, position + 1] = black2[1]
 
                 else:  # org is white
-                    white1, white2 = choice(white_variants)  # random split combination for white pixel
+                    white1, white2 = self.rng.choice(white_variants)  # random split combination for white pixel
                     share1[x, position] = white1
                     share1[x, position + 1] = white2
                     share2[x, position] = white1